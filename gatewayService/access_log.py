@@ -0,0 +1,127 @@
+import os
+import sys
+import json
+import time
+import queue
+import random
+import logging
+from logging.handlers import QueueHandler, QueueListener
+
+# Настройки журнала запросов шлюза
+ACCESS_LOG_SAMPLE_RATE = float(os.getenv("ACCESS_LOG_SAMPLE_RATE", "1.0"))
+ACCESS_LOG_ALWAYS_ERRORS = os.getenv("ACCESS_LOG_ALWAYS_ERRORS", "true").lower() in ("1", "true", "yes")
+ACCESS_LOG_QUEUE_SIZE = int(os.getenv("ACCESS_LOG_QUEUE_SIZE", "10000"))
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO").upper()
+
+access_logger = logging.getLogger("gateway.access")
+logger = logging.getLogger("gateway")
+
+
+class JsonFormatter(logging.Formatter):
+    def format(self, record: logging.LogRecord) -> str:
+        payload = {
+            "ts": round(record.created, 3),
+            "level": record.levelname,
+            "logger": record.name,
+            "msg": record.getMessage(),
+        }
+        payload.update(getattr(record, "fields", {}))
+        if record.exc_info:
+            payload["exc"] = self.formatException(record.exc_info)
+        return json.dumps(payload, ensure_ascii=False, default=str)
+
+
+class DroppingQueueHandler(QueueHandler):
+    """
+    Кладёт записи в ограниченную очередь, не блокируя event loop: форматирование и вывод
+    выполняет поток QueueListener, а при переполнении очереди запись отбрасывается.
+    """
+
+    def __init__(self, log_queue: queue.Queue):
+        super().__init__(log_queue)
+        self.dropped = 0
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        # Форматирование откладывается до потока-писателя
+        return record
+
+    def enqueue(self, record: logging.LogRecord):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+
+log_queue: queue.Queue = queue.Queue(maxsize=ACCESS_LOG_QUEUE_SIZE)
+queue_handler = DroppingQueueHandler(log_queue)
+_stream_handler = logging.StreamHandler(sys.stdout)
+_stream_handler.setFormatter(JsonFormatter())
+_listener = QueueListener(log_queue, _stream_handler)
+
+for _logger in (logger, access_logger):
+    _logger.setLevel(LOG_LEVEL)
+    _logger.addHandler(queue_handler)
+    _logger.propagate = False
+
+
+def start_logging():
+    _listener.start()
+
+
+def stop_logging():
+    # Дописывает накопившиеся записи перед остановкой
+    _listener.stop()
+
+
+def log_stats() -> dict:
+    return {
+        "queued": log_queue.qsize(),
+        "max_queue": ACCESS_LOG_QUEUE_SIZE,
+        "dropped": queue_handler.dropped,
+        "sample_rate": ACCESS_LOG_SAMPLE_RATE,
+    }
+
+
+class AccessLogMiddleware:
+    """
+    ASGI-middleware, пишущее одну JSON-строку на запрос: метод, путь, статус, размер ответа,
+    полное время обработки и данные о запросе к сервису, которые proxy кладёт в request.state.
+    Успешные запросы записываются с вероятностью ACCESS_LOG_SAMPLE_RATE, ошибки - всегда.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        started = time.perf_counter()
+        scope.setdefault("state", {})
+        response = {"status": 500, "bytes": 0}
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                response["status"] = message["status"]
+            elif message["type"] == "http.response.body":
+                response["bytes"] += len(message.get("body", b""))
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            status = response["status"]
+            if (ACCESS_LOG_ALWAYS_ERRORS and status >= 500) or random.random() < ACCESS_LOG_SAMPLE_RATE:
+                state = scope["state"]
+                fields = {
+                    "method": scope["method"],
+                    "path": scope["path"],
+                    "status": status,
+                    "bytes": response["bytes"],
+                    "duration_ms": round((time.perf_counter() - started) * 1000, 2),
+                }
+                for key in ("upstream", "upstream_path", "upstream_status", "upstream_ms", "cache"):
+                    if key in state:
+                        fields[key] = state[key]
+                access_logger.info("access", extra={"fields": fields})
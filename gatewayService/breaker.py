@@ -0,0 +1,114 @@
+import os
+import time
+from collections import deque
+
+# Настройки circuit breaker и бюджета повторов, общие для всех микросервисов
+BREAKER_WINDOW = int(os.getenv("BREAKER_WINDOW", "20"))
+BREAKER_MIN_REQUESTS = int(os.getenv("BREAKER_MIN_REQUESTS", "10"))
+BREAKER_ERROR_RATE = float(os.getenv("BREAKER_ERROR_RATE", "0.5"))
+BREAKER_OPEN_SECONDS = float(os.getenv("BREAKER_OPEN_SECONDS", "10"))
+RETRY_BUDGET_RATIO = float(os.getenv("RETRY_BUDGET_RATIO", "0.1"))
+RETRY_BUDGET_MAX = float(os.getenv("RETRY_BUDGET_MAX", "10"))
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+
+class CircuitOpenError(Exception):
+    pass
+
+
+class CircuitBreaker:
+    """
+    Размыкается, когда доля ошибок среди последних BREAKER_WINDOW запросов превышает порог.
+    Через BREAKER_OPEN_SECONDS пропускает один пробный запрос и по его результату замыкается или снова размыкается.
+    """
+
+    def __init__(self):
+        self.state = CLOSED
+        self._results: deque[bool] = deque(maxlen=BREAKER_WINDOW)
+        self._opened_at = 0.0
+        self._probe_in_flight = False
+        self.opened_total = 0
+        self.rejected_total = 0
+
+    def allow(self) -> bool:
+        if self.state == OPEN and time.monotonic() - self._opened_at >= BREAKER_OPEN_SECONDS:
+            self.state = HALF_OPEN
+        if self.state == CLOSED:
+            return True
+        if self.state == HALF_OPEN and not self._probe_in_flight:
+            self._probe_in_flight = True
+            return True
+        self.rejected_total += 1
+        return False
+
+    def record_success(self):
+        if self.state == HALF_OPEN:
+            self.state = CLOSED
+            self._results.clear()
+        self._probe_in_flight = False
+        self._results.append(True)
+
+    def abandon(self):
+        # Пробный запрос отменён без результата, следующий запрос сможет стать пробным
+        self._probe_in_flight = False
+
+    def record_failure(self):
+        self._probe_in_flight = False
+        self._results.append(False)
+        if self.state == HALF_OPEN or self._error_rate_exceeded():
+            self._open()
+
+    def _error_rate_exceeded(self) -> bool:
+        if len(self._results) < BREAKER_MIN_REQUESTS:
+            return False
+        failures = self._results.count(False)
+        return failures / len(self._results) >= BREAKER_ERROR_RATE
+
+    def _open(self):
+        if self.state != OPEN:
+            self.opened_total += 1
+        self.state = OPEN
+        self._opened_at = time.monotonic()
+        self._results.clear()
+
+    def stats(self) -> dict:
+        return {
+            "state": self.state,
+            "recent_requests": len(self._results),
+            "recent_failures": self._results.count(False),
+            "opened_total": self.opened_total,
+            "rejected_total": self.rejected_total,
+        }
+
+
+class RetryBudget:
+    """
+    Каждый запрос добавляет RETRY_BUDGET_RATIO токена, каждый повтор тратит один,
+    поэтому при массовых сбоях повторы не умножают нагрузку на сервис.
+    """
+
+    def __init__(self):
+        self.tokens = RETRY_BUDGET_MAX
+        self.retries_total = 0
+        self.exhausted_total = 0
+
+    def deposit(self):
+        self.tokens = min(RETRY_BUDGET_MAX, self.tokens + RETRY_BUDGET_RATIO)
+
+    def withdraw(self) -> bool:
+        if self.tokens < 1:
+            self.exhausted_total += 1
+            return False
+        self.tokens -= 1
+        self.retries_total += 1
+        return True
+
+    def stats(self) -> dict:
+        return {
+            "tokens": round(self.tokens, 2),
+            "retries_total": self.retries_total,
+            "exhausted_total": self.exhausted_total,
+        }
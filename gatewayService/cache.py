@@ -0,0 +1,141 @@
+import os
+import time
+import hashlib
+from collections import OrderedDict
+from typing import Optional
+
+# Общий кэш ответов шлюза в памяти
+RESPONSE_CACHE_MAX_BYTES = int(os.getenv("RESPONSE_CACHE_MAX_BYTES", str(64 * 1024 * 1024)))
+RESPONSE_CACHE_MAX_ITEM_BYTES = int(os.getenv("RESPONSE_CACHE_MAX_ITEM_BYTES", str(2 * 1024 * 1024)))
+
+
+class CacheRule:
+    """
+    Настройки кэширования маршрута. Cache-Control от сервиса имеет приоритет над ttl,
+    а vary_authorization хранит отдельную копию ответа для каждого токена.
+    """
+
+    def __init__(self, ttl: float, stale_while_revalidate: float = 0, vary_authorization: bool = False):
+        self.ttl = ttl
+        self.stale_while_revalidate = stale_while_revalidate
+        self.vary_authorization = vary_authorization
+
+
+class CachedResponse:
+    def __init__(self, status_code: int, headers: dict, body: bytes, ttl: float, stale_while_revalidate: float):
+        now = time.monotonic()
+        self.status_code = status_code
+        self.headers = headers
+        self.body = body
+        self.expires_at = now + ttl
+        self.stale_until = self.expires_at + stale_while_revalidate
+
+    def is_stale(self) -> bool:
+        return time.monotonic() >= self.expires_at
+
+
+class ByteCache:
+    """
+    LRU-кэш ответов с TTL, ограниченный суммарным размером тел в байтах.
+    """
+
+    def __init__(self, max_bytes: int, max_item_bytes: int):
+        self.max_bytes = max_bytes
+        self.max_item_bytes = max_item_bytes
+        self._entries: OrderedDict[str, CachedResponse] = OrderedDict()
+        self.size = 0
+        self.hits = 0
+        self.stale_hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key: str) -> Optional[CachedResponse]:
+        entry = self._entries.get(key)
+        if entry is not None and time.monotonic() >= entry.stale_until:
+            self.pop(key)
+            entry = None
+        if entry is None:
+            self.misses += 1
+            return None
+        self._entries.move_to_end(key)
+        if entry.is_stale():
+            self.stale_hits += 1
+        else:
+            self.hits += 1
+        return entry
+
+    def put(self, key: str, entry: CachedResponse):
+        if len(entry.body) > self.max_item_bytes:
+            return
+        self.pop(key)
+        self._entries[key] = entry
+        self.size += len(entry.body)
+        while self.size > self.max_bytes:
+            _, evicted = self._entries.popitem(last=False)
+            self.size -= len(evicted.body)
+            self.evictions += 1
+
+    def pop(self, key: str):
+        entry = self._entries.pop(key, None)
+        if entry is not None:
+            self.size -= len(entry.body)
+
+    def invalidate_prefix(self, prefix: str):
+        for key in [key for key in self._entries if key.startswith(prefix)]:
+            self.pop(key)
+
+    def stats(self) -> dict:
+        return {
+            "entries": len(self._entries),
+            "bytes": self.size,
+            "max_bytes": self.max_bytes,
+            "hits": self.hits,
+            "stale_hits": self.stale_hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+        }
+
+
+def cache_key(path: str, query: str, authorization: Optional[str], rule: CacheRule) -> str:
+    key = f"{path}?{query}"
+    if rule.vary_authorization:
+        key += "#" + hashlib.sha256((authorization or "").encode()).hexdigest()
+    return key
+
+
+def cache_lifetime(rule: CacheRule, headers) -> Optional[tuple[float, float]]:
+    """
+    Возвращает (ttl, stale_while_revalidate) для ответа или None, если его нельзя хранить в общем кэше.
+    """
+    if "set-cookie" in headers:
+        return None
+    directives = {}
+    for part in headers.get("cache-control", "").split(","):
+        name, _, value = part.strip().lower().partition("=")
+        if name:
+            directives[name] = value.strip('"')
+    if {"no-store", "no-cache", "private"} & directives.keys():
+        return None
+    ttl, stale = rule.ttl, rule.stale_while_revalidate
+    try:
+        if "s-maxage" in directives:
+            ttl = float(directives["s-maxage"])
+        elif "max-age" in directives:
+            ttl = float(directives["max-age"])
+        if "stale-while-revalidate" in directives:
+            stale = float(directives["stale-while-revalidate"])
+    except ValueError:
+        return None
+    if ttl <= 0:
+        return None
+    return ttl, stale
+
+
+def etag_matches(if_none_match: Optional[str], etag: Optional[str]) -> bool:
+    if not if_none_match or not etag:
+        return False
+    candidates = [tag.strip() for tag in if_none_match.split(",")]
+    return "*" in candidates or etag in candidates or f"W/{etag}" in candidates
+
+
+response_cache = ByteCache(RESPONSE_CACHE_MAX_BYTES, RESPONSE_CACHE_MAX_ITEM_BYTES)
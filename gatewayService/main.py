@@ -1,12 +1,44 @@
 import httpx
 import asyncio
 import os
-from fastapi import FastAPI, APIRouter, Request, Response, HTTPException
+import time
+from collections import OrderedDict
+from typing import Optional
+import websockets
+from contextlib import asynccontextmanager
+from fastapi import FastAPI, APIRouter, Request, Response, HTTPException, WebSocket, WebSocketDisconnect
 from fastapi.openapi.docs import get_swagger_ui_html
-from fastapi.responses import JSONResponse
+from fastapi.responses import JSONResponse, StreamingResponse
+from starlette.background import BackgroundTask
 from fastapi.middleware.cors import CORSMiddleware
+from upstream import UpstreamRegistry
+from breaker import CircuitOpenError, BREAKER_OPEN_SECONDS
+from routes import RouteMatch, RouteTrie, load_routes
+from access_log import AccessLogMiddleware, log_stats, logger, start_logging, stop_logging
+from cache import CacheRule, CachedResponse, cache_key, cache_lifetime, etag_matches, response_cache
 
-app = FastAPI(title="Gateway Service")
+# Базовые URL микросервисов
+USER_SERVICE_URL = os.getenv("USER_SERVICE_URL")
+MENU_SERVICE_URL = os.getenv("MENU_SERVICE_URL")
+PAYMENT_SERVICE_URL = os.getenv("PAYMENT_SERVICE_URL")
+NOTIFICATION_SERVICE_URL = os.getenv("NOTIFICATION_SERVICE_URL")
+
+# Общие пулы соединений ко всем микросервисам
+upstreams = UpstreamRegistry()
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    start_logging()
+    upstreams.register("user", USER_SERVICE_URL)
+    upstreams.register("menu", MENU_SERVICE_URL)
+    upstreams.register("payment", PAYMENT_SERVICE_URL)
+    upstreams.register("notification", NOTIFICATION_SERVICE_URL)
+    await merge_openapi_specs()
+    yield
+    await upstreams.aclose()
+    stop_logging()
+
+app = FastAPI(title="Gateway Service", lifespan=lifespan)
 
 app.add_middleware(
     CORSMiddleware,
@@ -14,27 +46,18 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["ETag", "X-Next-Cursor"],
 )
+app.add_middleware(AccessLogMiddleware)
 
-# Базовые URL микросервисов
-USER_SERVICE_URL = os.getenv("USER_SERVICE_URL")
-MENU_SERVICE_URL = os.getenv("MENU_SERVICE_URL")
-PAYMENT_SERVICE_URL = os.getenv("PAYMENT_SERVICE_URL")
-NOTIFICATION_SERVICE_URL = os.getenv("NOTIFICATION_SERVICE_URL")
-
-# Роутеры для разных микросервисов
-user_router = APIRouter(prefix="/users", tags=["Users"])
-menu_router = APIRouter(prefix="/menu", tags=["Menu"])
-payment_router = APIRouter(prefix="/payments", tags=["Payments"])
+# Роутер для WebSocket-потоков Notification Service
 notification_router = APIRouter(prefix="/notifications", tags=["Notifications"])
 
 async def get_remote_openapi(url):
-    async with httpx.AsyncClient() as client:
-        response = await client.get(f"{url}/openapi.json")
-        response.raise_for_status()
-        return response.json()
+    response = await upstreams.get(url).client.get(f"{url}/openapi.json")
+    response.raise_for_status()
+    return response.json()
 
-@app.on_event("startup")
 async def merge_openapi_specs():
     specs = []
     service_urls = [
@@ -50,10 +73,10 @@ async def merge_openapi_specs():
                 specs.append(spec)
                 break
             except httpx.RequestError as e:
-                print(f"Warning: Attempt {attempt + 1} failed to fetch OpenAPI spec from {url}: {e}")
+                logger.warning("Attempt %s failed to fetch OpenAPI spec from %s: %s", attempt + 1, url, e)
                 await asyncio.sleep(2) 
         else:
-            print(f"Error: Could not fetch OpenAPI spec from {url} after multiple attempts.")
+            logger.error("Could not fetch OpenAPI spec from %s after multiple attempts", url)
 
     merged_paths = {}
     merged_components = {"schemas": {}, "securitySchemes": {}}
@@ -89,153 +112,376 @@ async def custom_openapi():
 async def overridden_swagger():
     return get_swagger_ui_html(openapi_url="/openapi.json", title="Gateway API Docs")
 
+@app.get("/metrics/pools", include_in_schema=False)
+async def pool_metrics():
+    return JSONResponse(upstreams.stats())
+
+# Состояние circuit breaker каждого сервиса; сам шлюз при этом остаётся доступным
+@app.get("/health", include_in_schema=False)
+async def health():
+    services = upstreams.health()
+    healthy = all(service["state"] == "closed" for service in services.values())
+    return JSONResponse({"status": "ok" if healthy else "degraded", "services": services})
+
+@app.get("/metrics/access-log", include_in_schema=False)
+async def access_log_metrics():
+    return JSONResponse(log_stats())
+
+@app.get("/metrics/response-cache", include_in_schema=False)
+async def response_cache_metrics():
+    return JSONResponse({**response_cache.stats(), "single_flight": single_flight_stats})
+
 # Функция для проксирования запросов
 async def proxy(request: Request, service_url: str, path: str):
-    async with httpx.AsyncClient() as client:
+    upstream = upstreams.get(service_url)
+    client = upstream.client
+    upstream.acquire()
+    try:
+        headers = {key: value for key, value in request.headers.items() if key.lower() != 'host'}
+        url = upstream_url(service_url, path, request.url.query)
+
+        # Handling multipart/form-data
+        if request.headers.get("content-type", "").startswith("multipart/form-data"):
+            form = await request.form()
+            data = {}
+            files = []
+            for field, value in form.multi_items():
+                if hasattr(value, "filename"):
+                    files.append((field, (value.filename, await value.read(), value.content_type)))
+                else:
+                    data[field] = value
+
+            started = time.perf_counter()
+            response = await upstream.send(request.method, lambda: client.request(
+                method=request.method,
+                url=url,
+                headers=headers,
+                data=data,
+                files=files,
+            ))
+        else:
+            body = await request.body()
+            started = time.perf_counter()
+            response = await upstream.send(request.method, lambda: client.request(
+                method=request.method,
+                url=url,
+                headers=headers,
+                content=body,
+            ))
+
+        note_upstream(request, upstream, path, started, response.status_code)
+        return Response(
+            content=response.content,
+            status_code=response.status_code,
+            headers={key: value for key, value in response.headers.items() if key.lower() != 'content-encoding'},
+        )
+    except httpx.RequestError as e:
+        logger.warning("Request error while proxying to %s/%s: %s", service_url, path, e)
+        raise HTTPException(status_code=503, detail="Service Unavailable")
+    except CircuitOpenError:
+        raise circuit_open_error()
+    finally:
+        upstream.release()
+
+# Строка запроса передаётся как есть: повторяющиеся параметры (order_ids=1&order_ids=2) не теряются
+def upstream_url(service_url: str, path: str, query: str) -> str:
+    return f"{service_url}/{path}" + (f"?{query}" if query else "")
+
+# Данные о запросе к сервису для журнала запросов (AccessLogMiddleware)
+def note_upstream(request: Request, upstream, path: str, started: float, status_code: int):
+    request.state.upstream = upstream.name
+    request.state.upstream_path = path
+    request.state.upstream_status = status_code
+    request.state.upstream_ms = round((time.perf_counter() - started) * 1000, 2)
+
+# Сервис с разомкнутым circuit breaker не вызывается: клиент сразу получает 503
+def circuit_open_error() -> HTTPException:
+    return HTTPException(
+        status_code=503,
+        detail="Service Unavailable",
+        headers={"Retry-After": str(int(BREAKER_OPEN_SECONDS))},
+    )
+
+# Для долгоживущих потоков ограничивается только установка соединения
+STREAM_TIMEOUT = httpx.Timeout(5.0, read=None)
+
+# Заголовки, относящиеся к конкретному соединению, не пробрасываются при потоковой передаче
+HOP_BY_HOP_HEADERS = {"connection", "keep-alive", "transfer-encoding", "te", "trailer", "upgrade", "host"}
+
+# Потоковое проксирование: тело запроса и ответа передаются по частям, без буферизации в памяти
+async def proxy_stream(request: Request, service_url: str, path: str, timeout: httpx.Timeout = None,
+                       cache_as: str = None, cache_rule: CacheRule = None):
+    upstream = upstreams.get(service_url)
+    client = upstream.client
+    upstream.acquire()
+    try:
+        headers = {key: value for key, value in request.headers.items() if key.lower() not in HOP_BY_HOP_HEADERS}
+        has_body = "content-length" in request.headers or "transfer-encoding" in request.headers
+        extensions = {"timeout": timeout.as_dict()} if timeout else None
+        upstream_request = client.build_request(
+            method=request.method,
+            url=upstream_url(service_url, path, request.url.query),
+            headers=headers,
+            content=request.stream() if has_body else None,
+            extensions=extensions,
+        )
+        # Тело запроса читается из потока один раз, поэтому повторять можно только запросы без тела
+        started = time.perf_counter()
+        response = await upstream.send(
+            request.method,
+            lambda: client.send(upstream_request, stream=True),
+            replayable=not has_body,
+        )
+        # Для потоковых ответов это время до получения заголовков
+        note_upstream(request, upstream, path, started, response.status_code)
+    except httpx.RequestError as e:
+        upstream.release()
+        logger.warning("Request error while proxying to %s/%s: %s", service_url, path, e)
+        raise HTTPException(status_code=503, detail="Service Unavailable")
+    except CircuitOpenError:
+        upstream.release()
+        raise circuit_open_error()
+
+    async def close_response():
+        await response.aclose()
+        upstream.release()
+
+    response_headers = {key: value for key, value in response.headers.items() if key.lower() not in HOP_BY_HOP_HEADERS}
+    body = response.aiter_raw()
+    lifetime = cache_lifetime(cache_rule, response.headers) if cache_rule and response.status_code == 200 else None
+    if lifetime:
+        body = tee_into_cache(body, cache_as, response_headers, lifetime)
+
+    return StreamingResponse(
+        body,
+        status_code=response.status_code,
+        headers=response_headers,
+        background=BackgroundTask(close_response),
+    )
+
+# Копирует поток ответа в кэш, не задерживая отправку клиенту; слишком большие ответы не сохраняются
+async def tee_into_cache(chunks, key: str, headers: dict, lifetime: tuple[float, float]):
+    buffer = bytearray()
+    cacheable = True
+    async for chunk in chunks:
+        if cacheable:
+            buffer.extend(chunk)
+            if len(buffer) > response_cache.max_item_bytes:
+                cacheable = False
+                buffer = bytearray()
+        yield chunk
+    if cacheable:
+        response_cache.put(key, CachedResponse(200, headers, bytes(buffer), *lifetime))
+
+# Отдаёт ответ из кэша шлюза, учитывая If-None-Match клиента
+def cached_response(request: Request, entry: CachedResponse) -> Response:
+    etag = entry.headers.get("etag")
+    if etag_matches(request.headers.get("if-none-match"), etag):
+        headers = {key: value for key, value in entry.headers.items() if key.lower() in ("etag", "cache-control")}
+        return Response(status_code=304, headers=headers)
+    return Response(content=entry.body, status_code=entry.status_code, headers=entry.headers)
+
+# Условные заголовки клиента не передаются при общем запросе к сервису: нужен полный ответ
+CONDITIONAL_HEADERS = {"if-none-match", "if-modified-since", "if-range", "range"}
+# Запросы к сервису, выполняемые сейчас, по ключу кэша; одинаковые запросы ждут уже начатый
+in_flight: dict[str, asyncio.Task] = {}
+single_flight_stats = {"upstream_requests": 0, "coalesced": 0, "oversized": 0}
+# Ключи ответов, не помещающихся в кэш; такие запросы сразу идут потоком, минуя общий запрос
+OVERSIZED_KEYS_LIMIT = 4096
+oversized_keys: OrderedDict[str, None] = OrderedDict()
+
+def mark_oversized(key: str):
+    single_flight_stats["oversized"] += 1
+    oversized_keys[key] = None
+    oversized_keys.move_to_end(key)
+    while len(oversized_keys) > OVERSIZED_KEYS_LIMIT:
+        oversized_keys.popitem(last=False)
+
+def is_anonymous(request: Request) -> bool:
+    return "authorization" not in request.headers and "cookie" not in request.headers
+
+# Кэширующее проксирование GET-запросов: устаревший ответ отдаётся сразу и обновляется в фоне
+async def cached_proxy(request: Request, service_url: str, path: str, rule: CacheRule):
+    if "range" in request.headers:
+        return await proxy_stream(request, service_url, path)
+    key = cache_key(path, request.url.query, request.headers.get("authorization"), rule)
+    entry = response_cache.get(key)
+    if entry is not None:
+        request.state.cache = "stale" if entry.is_stale() else "hit"
+        if entry.is_stale() and key not in in_flight:
+            task = start_shared_fetch(key, service_url, path, request, rule)
+            task.add_done_callback(lambda t: t.cancelled() or t.exception())
+        return cached_response(request, entry)
+    request.state.cache = "miss"
+    if not is_anonymous(request) or key in oversized_keys:
+        return await proxy_stream(request, service_url, path, cache_as=key, cache_rule=rule)
+
+    # Одинаковые анонимные запросы получают один и тот же ответ от единственного запроса к сервису
+    task = in_flight.get(key)
+    if task is None:
+        task = start_shared_fetch(key, service_url, path, request, rule)
+    else:
+        request.state.cache = "coalesced"
+        single_flight_stats["coalesced"] += 1
+    entry = await asyncio.shield(task)
+    if entry is None:
+        # Ответ больше RESPONSE_CACHE_MAX_ITEM_BYTES: не буферизуется, а передаётся потоком
+        return await proxy_stream(request, service_url, path)
+    return cached_response(request, entry)
+
+def start_shared_fetch(key: str, service_url: str, path: str, request: Request, rule: CacheRule) -> asyncio.Task:
+    headers = {k: v for k, v in request.headers.items() if k.lower() not in HOP_BY_HOP_HEADERS | CONDITIONAL_HEADERS}
+    task = asyncio.create_task(fetch_shared(key, service_url, path, headers, request.url.query, rule))
+    in_flight[key] = task
+    task.add_done_callback(lambda _: in_flight.pop(key, None))
+    return task
+
+async def fetch_shared(key: str, service_url: str, path: str, headers: dict, query: str, rule: CacheRule) -> Optional[CachedResponse]:
+    """
+    Общий запрос к сервису для кэша. Тело собирается в память не больше чем до RESPONSE_CACHE_MAX_ITEM_BYTES;
+    для больших ответов возвращается None, и каждый ожидающий получает ответ потоком через proxy_stream.
+    """
+    upstream = upstreams.get(service_url)
+    upstream.acquire()
+    single_flight_stats["upstream_requests"] += 1
+    try:
+        url = upstream_url(service_url, path, query)
+        response = await upstream.send(
+            "GET", lambda: upstream.client.send(upstream.client.build_request("GET", url, headers=headers), stream=True)
+        )
+        try:
+            body = await read_limited(response, response_cache.max_item_bytes)
+        finally:
+            await response.aclose()
+    except httpx.RequestError as e:
+        logger.warning("Request error while proxying to %s/%s: %s", service_url, path, e)
+        raise HTTPException(status_code=503, detail="Service Unavailable")
+    except CircuitOpenError:
+        raise circuit_open_error()
+    finally:
+        upstream.release()
+
+    if body is None:
+        mark_oversized(key)
+        return None
+    response_headers = {k: v for k, v in response.headers.items() if k.lower() not in HOP_BY_HOP_HEADERS}
+    lifetime = cache_lifetime(rule, response.headers) if response.status_code == 200 else None
+    entry = CachedResponse(response.status_code, response_headers, body, *(lifetime or (0, 0)))
+    if lifetime:
+        response_cache.put(key, entry)
+    return entry
+
+# Читает тело ответа, пока оно не превышает limit; иначе None без чтения остатка
+async def read_limited(response: httpx.Response, limit: int) -> Optional[bytes]:
+    length = response.headers.get("content-length")
+    if length is not None and length.isdigit() and int(length) > limit:
+        return None
+    buffer = bytearray()
+    async for chunk in response.aiter_raw():
+        buffer.extend(chunk)
+        if len(buffer) > limit:
+            return None
+    return bytes(buffer)
+
+# Маршруты к микросервисам описаны таблицей в routes.py и разбираются одним проходом по префиксному дереву
+SERVICE_URLS = {
+    "user": USER_SERVICE_URL,
+    "menu": MENU_SERVICE_URL,
+    "payment": PAYMENT_SERVICE_URL,
+    "notification": NOTIFICATION_SERVICE_URL,
+}
+
+# Меню публичное, поэтому ответы общие для всех пользователей; Cache-Control сервиса имеет приоритет
+CACHE_RULES = {
+    "dishes": CacheRule(
+        ttl=float(os.getenv("DISHES_CACHE_TTL", "10")),
+        stale_while_revalidate=float(os.getenv("DISHES_CACHE_STALE", "30")),
+    ),
+    "images": CacheRule(ttl=float(os.getenv("IMAGES_CACHE_TTL", "3600"))),
+}
+
+def compile_routes() -> RouteTrie:
+    routes = load_routes()
+    for route in routes:
+        if route.upstream not in SERVICE_URLS:
+            raise ValueError(f"Unknown upstream {route.upstream!r} for {route.prefix}")
+        if route.cache is not None and route.cache not in CACHE_RULES:
+            raise ValueError(f"Unknown cache rule {route.cache!r} for {route.prefix}")
+    return RouteTrie(routes)
+
+route_trie = compile_routes()
+
+async def forward(request: Request, match: RouteMatch):
+    route = match.route
+    service_url = SERVICE_URLS[route.upstream]
+    if request.method == "GET" and route.cache:
+        response = await cached_proxy(request, service_url, match.path, CACHE_RULES[route.cache])
+    elif route.mode == "sse":
+        # SSE без таймаута чтения: сервис сам шлёт heartbeat
+        response = await proxy_stream(request, service_url, match.path, timeout=STREAM_TIMEOUT)
+    elif route.mode == "stream":
+        response = await proxy_stream(request, service_url, match.path)
+    else:
+        response = await proxy(request, service_url, match.path)
+    if route.invalidate and request.method not in ("GET", "HEAD", "OPTIONS"):
+        # Изменения через шлюз сразу сбрасывают закэшированные ответы этой реплики
+        response_cache.invalidate_prefix(route.invalidate)
+    location = response.headers.get("location")
+    if location:
+        response.headers["location"] = match.public_location(location, service_url)
+    return response
+
+# Поток статусов заказа по WebSocket проксируется отдельно: таблица маршрутов описывает только HTTP
+@notification_router.websocket("/orders/{order_id}/status/ws")
+async def websocket_order_statuses(websocket: WebSocket, order_id: int):
+    url = NOTIFICATION_SERVICE_URL.replace("http", "ws", 1) + f"/notifications/orders/{order_id}/status/ws"
+    if websocket.url.query:
+        url += f"?{websocket.url.query}"
+    headers = {"Authorization": websocket.headers["authorization"]} if "authorization" in websocket.headers else {}
+    try:
+        upstream_ws = await websockets.connect(url, additional_headers=headers)
+    except (OSError, websockets.InvalidHandshake) as e:
+        logger.warning("WebSocket error while proxying to %s: %s", url, e)
+        await websocket.close(code=1011)
+        return
+
+    await websocket.accept()
+
+    async def client_to_upstream():
         try:
-            # Log the proxied request details
-            print(f"Proxying {request.method} request to: {service_url}/{path}")
-            
-            # Existing proxy logic...
-            headers = {key: value for key, value in request.headers.items() if key.lower() != 'host'}
-            params = dict(request.query_params)
-            
-            # Handling multipart/form-data
-            if request.headers.get("content-type", "").startswith("multipart/form-data"):
-                form = await request.form()
-                data = {}
-                files = []
-                for field, value in form.multi_items():
-                    if hasattr(value, "filename"):
-                        files.append((field, (value.filename, await value.read(), value.content_type)))
-                    else:
-                        data[field] = value
-                
-                response = await client.request(
-                    method=request.method,
-                    url=f"{service_url}/{path}",
-                    headers=headers,
-                    params=params,
-                    data=data,
-                    files=files,
-                )
-            else:
-                body = await request.body()
-                response = await client.request(
-                    method=request.method,
-                    url=f"{service_url}/{path}",
-                    headers=headers,
-                    params=params,
-                    content=body,
-                )
-            
-            # Log the response status
-            print(f"Received response with status: {response.status_code},GGGG {service_url}/{path}")
-            
-            return Response(
-                content=response.content,
-                status_code=response.status_code,
-                headers={key: value for key, value in response.headers.items() if key.lower() != 'content-encoding'},
-            )
-        except httpx.RequestError as e:
-            print(f"Request error while proxying to {service_url}/{path}: {e}")
-            raise HTTPException(status_code=503, detail="Service Unavailable")
-
-# Маршруты для User Service
-@user_router.post("/registration/")
-async def create_user(request: Request):
-    print(request)
-    return await proxy(request, USER_SERVICE_URL, "users/registration/")
-
-@user_router.post("/admin/registration/")
-async def create_admin_user(request: Request):
-    return await proxy(request, USER_SERVICE_URL, "users/admin/registration/")
-
-@user_router.post("/token")
-async def login_for_access_token(request: Request):
-    return await proxy(request, USER_SERVICE_URL, "users/token")
-
-@user_router.get("/users/me")
-async def read_users_me(request: Request):
-    return await proxy(request, USER_SERVICE_URL, "users/me/")
-
-# Маршруты для Menu Service
-@menu_router.post("/dishes/")
-async def create_dish(request: Request):
-    return await proxy(request, MENU_SERVICE_URL, "menu/dishes/")
-
-@menu_router.get("/dishes/{dish_id}")
-async def read_dish(request: Request, dish_id: int):
-    return await proxy(request, MENU_SERVICE_URL, f"menu/dishes/{dish_id}")
-
-@menu_router.get("/dishes/")
-async def read_dishes(request: Request):
-    return await proxy(request, MENU_SERVICE_URL, "menu/dishes/")
-
-@menu_router.put("/dishes/{dish_id}")
-async def update_dish(request: Request, dish_id: int):
-    return await proxy(request, MENU_SERVICE_URL, f"menu/dishes/{dish_id}")
-
-@menu_router.delete("/dishes/{dish_id}")
-async def delete_dish(request: Request, dish_id: int):
-    return await proxy(request, MENU_SERVICE_URL, f"menu/dishes/{dish_id}")
-
-@menu_router.get("/images/{filename}")
-async def get_menu_image(request: Request, filename: str):
-    return await proxy(request, MENU_SERVICE_URL, f"images/{filename}")
-
-# Маршруты для Payment Service
-@payment_router.post("/pay/")
-async def process_payment(request: Request):
-    return await proxy(request, PAYMENT_SERVICE_URL, "payments/pay/")
-
-@payment_router.get("/pay/{transaction_id}")
-async def read_transaction(request: Request, transaction_id: int):
-    return await proxy(request, PAYMENT_SERVICE_URL, f"payments/pay/{transaction_id}")
-
-@payment_router.get("/pay/")
-async def read_transactions(request: Request):
-    return await proxy(request, PAYMENT_SERVICE_URL, "payments/pay/")
-
-@payment_router.post("/orders/")
-async def create_order(request: Request):
-    return await proxy(request, PAYMENT_SERVICE_URL, "payments/orders/")
-
-@payment_router.get("/orders/{order_id}")
-async def read_order(request: Request, order_id: int):
-    return await proxy(request, PAYMENT_SERVICE_URL, f"payments/orders/{order_id}")
-
-@payment_router.get("/orders/")
-async def read_orders(request: Request):
-    return await proxy(request, PAYMENT_SERVICE_URL, "payments/orders/")
-
-@payment_router.put("/orders/{order_id}/status/")
-async def update_order_status(request: Request, order_id: int):
-    return await proxy(request, PAYMENT_SERVICE_URL, f"payments/orders/{order_id}/status/")
-
-# Маршруты для Notification Service
-@notification_router.post("/status/")
-async def add_order_status(request: Request):
-    return await proxy(request, NOTIFICATION_SERVICE_URL, "notifications/status/")
-
-@notification_router.get("/status/{status_id}")
-async def read_order_status(request: Request, status_id: int):
-    return await proxy(request, NOTIFICATION_SERVICE_URL, f"notifications/status/{status_id}")
-
-@notification_router.get("/orders/{order_id}/status/")
-async def read_order_statuses(request: Request, order_id: int):
-    return await proxy(request, NOTIFICATION_SERVICE_URL, f"notifications/orders/{order_id}/status/")
-
-@notification_router.put("/status/{status_id}/")
-async def update_order_status(request: Request, status_id: int):
-    return await proxy(request, NOTIFICATION_SERVICE_URL, f"notifications/status/{status_id}/")
+            while True:
+                await upstream_ws.send(await websocket.receive_text())
+        except WebSocketDisconnect:
+            pass
+
+    async def upstream_to_client():
+        try:
+            async for message in upstream_ws:
+                await websocket.send_text(message)
+        except websockets.ConnectionClosed:
+            pass
+
+    tasks = [asyncio.create_task(client_to_upstream()), asyncio.create_task(upstream_to_client())]
+    await asyncio.wait(tasks, return_when=asyncio.FIRST_COMPLETED)
+    for task in tasks:
+        task.cancel()
+    await upstream_ws.close()
+    try:
+        await websocket.close()
+    except RuntimeError:
+        pass
 
 # Подключаем роутеры к приложению
-app.include_router(user_router)
-app.include_router(menu_router)
-app.include_router(payment_router)
 app.include_router(notification_router)
 
+# Все остальные HTTP-запросы разбираются по таблице маршрутов; объявлен последним, чтобы не перекрывать служебные пути
+@app.api_route("/{path:path}", methods=["GET", "HEAD", "POST", "PUT", "PATCH", "DELETE", "OPTIONS"], include_in_schema=False)
+async def gateway(request: Request, path: str):
+    match = route_trie.match(request.url.path)
+    if match is None:
+        raise HTTPException(status_code=404, detail="Not Found")
+    return await forward(request, match)
+
 if __name__ == "__main__":
     import uvicorn
     uvicorn.run(app, host="0.0.0.0", port=80)
\ No newline at end of file
@@ -0,0 +1,153 @@
+import os
+import json
+from typing import Optional
+
+# Таблица маршрутов шлюза: префикс пути -> микросервис и префикс пути в нём.
+# Всё, что лежит под префиксом, проксируется без изменений в коде шлюза, поэтому новые
+# эндпоинты сервисов доступны сразу. Таблицу можно заменить JSON-файлом из GATEWAY_ROUTES_FILE.
+#
+# mode: "buffered" - обычное проксирование, "stream" - потоковое, "sse" - потоковое без таймаута чтения
+# cache: правило кэширования GET-запросов шлюзом (см. CACHE_RULES в main.py)
+# invalidate: префикс ключей кэша, сбрасываемый после изменяющих запросов
+# trailing_slash: запрос ровно на префикс уходит в сервис с "/" на конце, иначе сервис ответит редиректом
+DEFAULT_ROUTES = [
+    {"prefix": "/users", "upstream": "user", "rewrite": "users"},
+    # Старый адрес профиля, оставлен для совместимости с клиентами
+    {"prefix": "/users/users/me", "upstream": "user", "rewrite": "users/me/"},
+    {"prefix": "/menu", "upstream": "menu", "rewrite": "menu"},
+    {"prefix": "/menu/dishes", "upstream": "menu", "rewrite": "menu/dishes", "trailing_slash": True,
+     "mode": "stream", "cache": "dishes", "invalidate": "menu/dishes/"},
+    {"prefix": "/menu/images", "upstream": "menu", "rewrite": "menu/images", "cache": "images"},
+    {"prefix": "/payments", "upstream": "payment", "rewrite": "payments"},
+    {"prefix": "/notifications", "upstream": "notification", "rewrite": "notifications"},
+    {"prefix": "/notifications/orders/{order_id}/status/stream", "upstream": "notification",
+     "rewrite": "notifications/orders/{order_id}/status/stream", "mode": "sse"},
+]
+
+GATEWAY_ROUTES_FILE = os.getenv("GATEWAY_ROUTES_FILE")
+
+ROUTE_MODES = {"buffered", "stream", "sse"}
+
+
+class Route:
+    def __init__(self, prefix: str, upstream: str, rewrite: str, mode: str = "buffered",
+                 cache: Optional[str] = None, invalidate: Optional[str] = None, trailing_slash: bool = False):
+        if mode not in ROUTE_MODES:
+            raise ValueError(f"Unknown route mode {mode!r} for {prefix}")
+        self.prefix = prefix
+        self.upstream = upstream
+        self.rewrite = rewrite
+        self.mode = mode
+        self.cache = cache
+        self.invalidate = invalidate
+        self.trailing_slash = trailing_slash
+
+    def upstream_path(self, params: dict, remainder: list[str]) -> str:
+        path = self.rewrite.format(**params)
+        if not remainder:
+            return path.rstrip("/") + "/" if self.trailing_slash else path
+        return path.rstrip("/") + "/" + "/".join(remainder)
+
+
+class RouteMatch:
+    def __init__(self, route: Route, path: str, public_prefix: str, upstream_prefix: str):
+        self.route = route
+        self.path = path
+        self.public_prefix = public_prefix
+        self.upstream_prefix = upstream_prefix
+
+    def public_location(self, location: str, service_url: str) -> str:
+        """
+        Переводит Location, указывающий на сервис (например, редирект на путь со "/"), в адрес шлюза:
+        внутреннее имя хоста клиенту недоступно. Остальные адреса возвращаются без изменений.
+        """
+        base = service_url.rstrip("/")
+        if not location.startswith(base + "/"):
+            return location
+        path = location[len(base):]
+        rest = path[len(self.upstream_prefix):]
+        if path.startswith(self.upstream_prefix) and rest[:1] in ("", "/", "?"):
+            path = self.public_prefix + rest
+        return path
+
+
+class _Node:
+    __slots__ = ("children", "param", "param_name", "route")
+
+    def __init__(self):
+        self.children: dict[str, _Node] = {}
+        self.param: Optional[_Node] = None
+        self.param_name: Optional[str] = None
+        self.route: Optional[Route] = None
+
+
+class RouteTrie:
+    """
+    Префиксное дерево по сегментам пути; побеждает самый длинный совпавший префикс.
+    Сегмент вида {name} совпадает с любым непустым сегментом и подставляется в rewrite.
+    Пути с сегментами ".", ".." и пустыми сегментами не совпадают ни с чем: иначе после нормализации
+    URL запрос вышел бы за префикс маршрута, например к служебным /metrics и /docs сервиса.
+    """
+
+    def __init__(self, routes: list[Route]):
+        self.root = _Node()
+        for route in routes:
+            self.add(route)
+
+    def add(self, route: Route):
+        node = self.root
+        for segment in _segments(route.prefix):
+            if segment.startswith("{") and segment.endswith("}"):
+                if node.param is None:
+                    node.param = _Node()
+                    node.param_name = segment[1:-1]
+                elif node.param_name != segment[1:-1]:
+                    raise ValueError(f"Conflicting parameter {segment} in {route.prefix}")
+                node = node.param
+            else:
+                node = node.children.setdefault(segment, _Node())
+        node.route = route
+
+    def match(self, path: str) -> Optional[RouteMatch]:
+        # Завершающий "/" сохраняется пустым последним сегментом, чтобы путь в сервисе его не потерял
+        segments = path.lstrip("/").split("/")
+        if any(segment in UNSAFE_SEGMENTS for segment in segments[:-1]) or segments[-1] in (".", ".."):
+            return None
+        found = self._match(self.root, segments, 0, {})
+        if found is None:
+            return None
+        route, depth, params = found
+        public_prefix = "/" + "/".join(segments[:depth])
+        upstream_prefix = "/" + route.rewrite.format(**params).rstrip("/")
+        return RouteMatch(route, route.upstream_path(params, segments[depth:]), public_prefix, upstream_prefix)
+
+    def _match(self, node: _Node, segments: list[str], depth: int, params: dict):
+        best = (node.route, depth, params) if node.route is not None else None
+        if depth == len(segments) or not segments[depth]:
+            return best
+        segment = segments[depth]
+        child = node.children.get(segment)
+        if child is not None:
+            found = self._match(child, segments, depth + 1, params)
+            if found is not None:
+                return found
+        if node.param is not None:
+            found = self._match(node.param, segments, depth + 1, {**params, node.param_name: segment})
+            if found is not None:
+                return found
+        return best
+
+
+UNSAFE_SEGMENTS = {"", ".", ".."}
+
+
+def _segments(prefix: str) -> list[str]:
+    return [segment for segment in prefix.strip("/").split("/") if segment]
+
+
+def load_routes() -> list[Route]:
+    table = DEFAULT_ROUTES
+    if GATEWAY_ROUTES_FILE:
+        with open(GATEWAY_ROUTES_FILE) as f:
+            table = json.load(f)
+    return [Route(**entry) for entry in table]
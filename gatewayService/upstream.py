@@ -0,0 +1,149 @@
+import os
+import random
+import asyncio
+import httpx
+from breaker import CircuitBreaker, CircuitOpenError, RetryBudget
+
+# Настройки пула соединений к микросервисам
+UPSTREAM_MAX_CONNECTIONS = int(os.getenv("UPSTREAM_MAX_CONNECTIONS", "100"))
+UPSTREAM_MAX_KEEPALIVE_CONNECTIONS = int(os.getenv("UPSTREAM_MAX_KEEPALIVE_CONNECTIONS", "20"))
+UPSTREAM_KEEPALIVE_EXPIRY = float(os.getenv("UPSTREAM_KEEPALIVE_EXPIRY", "5.0"))
+UPSTREAM_HTTP2 = os.getenv("UPSTREAM_HTTP2", "false").lower() in ("1", "true", "yes")
+
+# Повторы только для идемпотентных методов и только при сетевых ошибках или 502/503/504
+UPSTREAM_RETRIES = int(os.getenv("UPSTREAM_RETRIES", "2"))
+UPSTREAM_RETRY_BACKOFF = float(os.getenv("UPSTREAM_RETRY_BACKOFF", "0.05"))
+IDEMPOTENT_METHODS = {"GET", "HEAD", "OPTIONS", "PUT", "DELETE"}
+RETRYABLE_STATUSES = {502, 503, 504}
+
+
+def upstream_timeout(name: str) -> httpx.Timeout:
+    # Таймауты задаются отдельно для каждого сервиса, например PAYMENT_CONNECT_TIMEOUT и PAYMENT_READ_TIMEOUT
+    prefix = name.upper()
+    connect = float(os.getenv(f"{prefix}_CONNECT_TIMEOUT", "2.0"))
+    read = float(os.getenv(f"{prefix}_READ_TIMEOUT", "10.0"))
+    return httpx.Timeout(read, connect=connect)
+
+
+class Upstream:
+    """
+    Долгоживущий httpx-клиент с собственным пулом keep-alive соединений для одного микросервиса.
+    """
+
+    def __init__(self, name: str, base_url: str):
+        self.name = name
+        self.base_url = base_url
+        self.client = httpx.AsyncClient(
+            limits=httpx.Limits(
+                max_connections=UPSTREAM_MAX_CONNECTIONS,
+                max_keepalive_connections=UPSTREAM_MAX_KEEPALIVE_CONNECTIONS,
+                keepalive_expiry=UPSTREAM_KEEPALIVE_EXPIRY,
+            ),
+            http2=UPSTREAM_HTTP2,
+            timeout=upstream_timeout(name),
+        )
+        self.breaker = CircuitBreaker()
+        self.retry_budget = RetryBudget()
+        self.requests_total = 0
+        self.in_flight = 0
+        self.peak_in_flight = 0
+
+    def acquire(self):
+        self.requests_total += 1
+        self.in_flight += 1
+        self.peak_in_flight = max(self.peak_in_flight, self.in_flight)
+
+    def release(self):
+        self.in_flight -= 1
+
+    async def send(self, method: str, send, replayable: bool = True) -> httpx.Response:
+        """
+        Выполняет запрос через circuit breaker; идемпотентные запросы повторяются
+        с экспоненциальной задержкой и случайным разбросом, пока позволяет бюджет повторов.
+        """
+        self.retry_budget.deposit()
+        retries = UPSTREAM_RETRIES if replayable and method.upper() in IDEMPOTENT_METHODS else 0
+        attempt = 0
+        while True:
+            if not self.breaker.allow():
+                raise CircuitOpenError(f"Circuit for {self.name} is open")
+            try:
+                response = await send()
+            except httpx.RequestError:
+                self.breaker.record_failure()
+                if not await self._retry(attempt, retries):
+                    raise
+                attempt += 1
+                continue
+            except BaseException:
+                self.breaker.abandon()
+                raise
+            if response.status_code in RETRYABLE_STATUSES:
+                self.breaker.record_failure()
+                if await self._retry(attempt, retries, response):
+                    attempt += 1
+                    continue
+            else:
+                self.breaker.record_success()
+            return response
+
+    async def _retry(self, attempt: int, retries: int, response: httpx.Response = None) -> bool:
+        if attempt >= retries or not self.retry_budget.withdraw():
+            return False
+        if response is not None:
+            await response.aclose()
+        await asyncio.sleep(random.uniform(0, UPSTREAM_RETRY_BACKOFF * 2 ** attempt))
+        return True
+
+    def stats(self) -> dict:
+        # httpx не отдаёт состояние пула публично, поэтому читаем его из транспорта httpcore
+        pool = getattr(getattr(self.client, "_transport", None), "_pool", None)
+        connections = list(getattr(pool, "connections", []))
+        return {
+            "url": self.base_url,
+            "requests_total": self.requests_total,
+            "in_flight": self.in_flight,
+            "peak_in_flight": self.peak_in_flight,
+            "connections": len(connections),
+            "idle_connections": sum(1 for conn in connections if conn.is_idle()),
+            "max_connections": UPSTREAM_MAX_CONNECTIONS,
+            "max_keepalive_connections": UPSTREAM_MAX_KEEPALIVE_CONNECTIONS,
+            "keepalive_expiry": UPSTREAM_KEEPALIVE_EXPIRY,
+            "http2": UPSTREAM_HTTP2,
+            "breaker": self.breaker.stats(),
+            "retry_budget": self.retry_budget.stats(),
+        }
+
+    def health(self) -> dict:
+        return {"url": self.base_url, **self.breaker.stats()}
+
+    async def aclose(self):
+        await self.client.aclose()
+
+
+class UpstreamRegistry:
+    """
+    Набор пулов по одному на микросервис; создаётся и закрывается в lifespan шлюза.
+    """
+
+    def __init__(self):
+        self._by_url: dict[str, Upstream] = {}
+
+    def register(self, name: str, base_url: str) -> Upstream:
+        upstream = Upstream(name, base_url)
+        self._by_url[base_url] = upstream
+        return upstream
+
+    def get(self, base_url: str) -> Upstream:
+        return self._by_url[base_url]
+
+    def stats(self) -> dict:
+        return {upstream.name: upstream.stats() for upstream in self._by_url.values()}
+
+    def health(self) -> dict:
+        return {upstream.name: upstream.health() for upstream in self._by_url.values()}
+
+    async def aclose(self):
+        for upstream in self._by_url.values():
+            await upstream.aclose()
+        self._by_url.clear()
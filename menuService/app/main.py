@@ -2,7 +2,8 @@ from fastapi import FastAPI
 from fastapi.staticfiles import StaticFiles
 from contextlib import asynccontextmanager
 from app.models import models
-from app.dependencies import engine
+from app.dependencies import engine, read_engine
+from app.utils import auth, database, images
 from app.routers import menu
 from fastapi.openapi.utils import get_openapi
 
@@ -11,6 +12,7 @@ async def lifespan(app: FastAPI):
     async with engine.begin() as conn:
         await conn.run_sync(models.Base.metadata.create_all)
     yield
+    images.shutdown_pools()
 
 app = FastAPI(lifespan=lifespan)
 
@@ -19,6 +21,17 @@ app.mount("/images", StaticFiles(directory="images"), name="images")
 
 app.include_router(menu.router, prefix="/menu", tags=["Menu"])
 
+@app.get("/metrics/db-pool", include_in_schema=False)
+async def db_pool_metrics():
+    stats = database.pool_stats(engine)
+    if read_engine is not engine:
+        stats["replica"] = database.pool_stats(read_engine)
+    return stats
+
+@app.get("/metrics/auth-cache", include_in_schema=False)
+async def auth_cache_metrics():
+    return auth.identity_cache.stats()
+
 def custom_openapi():
     if app.openapi_schema:
         return app.openapi_schema
@@ -1,18 +1,16 @@
-import os
-from fastapi import APIRouter, Depends, UploadFile, File, Form, Query, HTTPException
+from fastapi import APIRouter, Depends, UploadFile, File, Form, Query, HTTPException, Request, Response
 from fastapi.responses import FileResponse
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.exc import IntegrityError
 from app import dependencies
-from app.utils import crud
+from app.utils import crud, images
+from app.utils.cache import menu_cache, etag_matches, MENU_CACHE_CONTROL
+from app.utils.pagination import decode_cursor, next_cursor
 from app.schemas import schemas
-from pathlib import Path
 from typing import Optional
 
 router = APIRouter()
 
-IMAGES_DIR = "/app/images" 
-
 @router.post("/dishes/", response_model=schemas.DishOut)
 async def create_dish(
     name: str = Form(...),
@@ -24,42 +22,83 @@ async def create_dish(
 ):
     try:
         # Сохранение изображения
-        image_path = Path("images") / image.filename
-        image_path.parent.mkdir(parents=True, exist_ok=True)
-        with open(image_path, "wb") as buffer:
-            buffer.write(image.file.read())
+        image_url = await images.save_upload(image)
 
         dish_data = schemas.DishCreate(
             name=name,
             description=description,
             price=price,
-            image_url=str(image_path),
+            image_url=image_url,
         )
         created_dish = await crud.create_dish(db=db, dish=dish_data)
         if not created_dish:
             raise HTTPException(status_code=400, detail="Failed to create dish")
+        await menu_cache.invalidate()
         return created_dish
 
     except IntegrityError:
         raise HTTPException(status_code=400, detail=f"Dish with name '{name}' already exists.")
 
 @router.get("/dishes/{dish_id}", response_model=schemas.DishOut)
-async def read_dish(dish_id: int, db: AsyncSession = Depends(dependencies.get_db)):
-    db_dish = await crud.get_dish(db, dish_id=dish_id)
-    if db_dish is None:
-        raise HTTPException(status_code=404, detail="Dish not found")
-    return db_dish
+async def read_dish(
+    dish_id: int,
+    request: Request,
+    response: Response,
+    db: AsyncSession = Depends(dependencies.get_read_db)
+):
+    key = f"dish:{dish_id}"
+    version = await menu_cache.version()
+    etag = menu_cache.etag(version, key)
+    if etag_matches(request.headers.get("if-none-match"), etag):
+        return Response(status_code=304, headers={"ETag": etag})
+
+    dish = await menu_cache.get(version, key)
+    if dish is None:
+        db_dish = await crud.get_dish(db, dish_id=dish_id)
+        if db_dish is None:
+            raise HTTPException(status_code=404, detail="Dish not found")
+        dish = schemas.DishOut.model_validate(db_dish).model_dump(mode="json")
+        await menu_cache.set(version, key, dish)
+
+    response.headers["ETag"] = etag
+    response.headers["Cache-Control"] = MENU_CACHE_CONTROL
+    return dish
 
 @router.get("/dishes/", response_model=schemas.DishResponse)
 async def read_dishes(
+    request: Request,
+    response: Response,
     skip: int = Query(0, ge=0),
     limit: int = Query(10, ge=1, le=100),
-    db: AsyncSession = Depends(dependencies.get_db)
+    after: Optional[str] = Query(None, description="Курсор из next_cursor предыдущей страницы"),
+    with_total: bool = Query(True, description="Возвращать общее количество блюд"),
+    db: AsyncSession = Depends(dependencies.get_read_db)
 ):
-    dishes = await crud.get_dishes(db, skip=skip, limit=limit)
-    if not dishes:
-        raise HTTPException(status_code=404, detail="No dishes found")
-
+    after_id = decode_cursor(after)
+    key = f"dishes:{skip}:{limit}:{after_id}:{with_total}"
+    version = await menu_cache.version()
+    etag = menu_cache.etag(version, key)
+    if etag_matches(request.headers.get("if-none-match"), etag):
+        return Response(status_code=304, headers={"ETag": etag})
+
+    dishes = await menu_cache.get(version, key)
+    if dishes is None:
+        result = await crud.get_dishes(db, skip=skip, limit=limit, after_id=after_id, with_total=False)
+        if not result:
+            raise HTTPException(status_code=404, detail="No dishes found")
+        result["next_cursor"] = next_cursor(result["dishes"], limit)
+        if with_total:
+            # Общее количество кэшируется отдельно и не пересчитывается для каждой страницы
+            total = await menu_cache.get(version, "dishes:count")
+            if total is None:
+                total = await crud.count_dishes(db)
+                await menu_cache.set(version, "dishes:count", total)
+            result["total"] = total
+        dishes = schemas.DishResponse.model_validate(result, from_attributes=True).model_dump(mode="json")
+        await menu_cache.set(version, key, dishes)
+
+    response.headers["ETag"] = etag
+    response.headers["Cache-Control"] = MENU_CACHE_CONTROL
     return dishes
 
 @router.put("/dishes/{dish_id}", response_model=schemas.DishOut)
@@ -84,15 +123,12 @@ async def update_dish(
             raise HTTPException(status_code=404, detail="Dish not found")
 
         if image:
-            image_path = Path("images") / image.filename
-            image_path.parent.mkdir(parents=True, exist_ok=True)
-            with open(image_path, "wb") as buffer:
-                buffer.write(image.file.read())
-            dish_update_data["image_url"] = str(image_path)
+            dish_update_data["image_url"] = await images.save_upload(image)
 
         updated_dish = await crud.update_dish(db=db, dish_id=dish_id, dish_update=dish_update_data)
         if not updated_dish:
             raise HTTPException(status_code=400, detail="Failed to update dish")
+        await menu_cache.invalidate()
 
         return updated_dish
 
@@ -116,11 +152,24 @@ async def delete_dish(
     result = await crud.delete_dish(db=db, dish_id=dish_id)
     if not result:
         raise HTTPException(status_code=400, detail="Failed to delete dish")
+    await menu_cache.invalidate()
     return {"message": "Dish deleted successfully"}
 
 @router.get("/images/{filename}")
-async def get_image(filename: str):
-    file_path = os.path.join(IMAGES_DIR, filename)
-    if os.path.isfile(file_path):
-        return FileResponse(file_path)
-    return {"error": "File not found"}
+async def get_image(
+    filename: str,
+    request: Request,
+    size: Optional[str] = Query(None, description="thumb или medium; без параметра отдаётся оригинал")
+):
+    file_path = images.resolve_image(filename, size)
+    if not file_path:
+        raise HTTPException(status_code=404, detail="File not found")
+
+    headers = images.cache_headers(file_path)
+    if size in images.IMAGE_VARIANTS and file_path.parent != images.VARIANTS_DIR:
+        # Уменьшенная копия ещё не готова: оригинал под этим URL нельзя кэшировать надолго
+        headers["Cache-Control"] = "public, max-age=60"
+    if etag_matches(request.headers.get("if-none-match"), headers["ETag"]):
+        return Response(status_code=304, headers=headers)
+    # FileResponse сам обрабатывает Range и If-Range, используя переданный ETag
+    return FileResponse(file_path, headers=headers)
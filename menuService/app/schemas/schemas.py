@@ -27,7 +27,8 @@ class DishOut(DishBase):
 
 class DishResponse(BaseModel):
     dishes: list[DishOut]
-    total: int
+    total: Optional[int] = None
+    next_cursor: Optional[str] = None
     
     class Config:
         from_attributes = True
@@ -0,0 +1,127 @@
+import os
+import json
+import time
+import hashlib
+from collections import OrderedDict
+from typing import Optional
+
+# Настройки кэша меню
+MENU_CACHE_BACKEND = os.getenv("MENU_CACHE_BACKEND", "memory")
+MENU_CACHE_REDIS_URL = os.getenv("MENU_CACHE_REDIS_URL", "redis://localhost:6379/0")
+MENU_CACHE_TTL = float(os.getenv("MENU_CACHE_TTL", "300"))
+MENU_CACHE_SIZE = int(os.getenv("MENU_CACHE_SIZE", "1024"))
+# Браузеры перепроверяют меню по ETag при каждом запросе, общий кэш шлюза может хранить его недолго
+MENU_SHARED_MAX_AGE = int(os.getenv("MENU_SHARED_MAX_AGE", "10"))
+MENU_CACHE_CONTROL = f"public, max-age=0, s-maxage={MENU_SHARED_MAX_AGE}, stale-while-revalidate=30"
+
+VERSION_KEY = "menu:version"
+
+
+class MemoryBackend:
+    """
+    Кэш в памяти процесса: LRU с ограничением по числу записей и TTL.
+    """
+
+    def __init__(self, max_size: int):
+        self.max_size = max_size
+        self._entries: OrderedDict[str, tuple[float, str]] = OrderedDict()
+        # Начальная версия уникальна для процесса, чтобы ETag из прошлого запуска не совпал случайно
+        self._version = time.time_ns()
+
+    async def get(self, key: str) -> Optional[str]:
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        expires_at, value = entry
+        if expires_at <= time.monotonic():
+            del self._entries[key]
+            return None
+        self._entries.move_to_end(key)
+        return value
+
+    async def set(self, key: str, value: str, ttl: float):
+        self._entries[key] = (time.monotonic() + ttl, value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+
+    async def get_version(self) -> int:
+        return self._version
+
+    async def incr_version(self) -> int:
+        self._version += 1
+        return self._version
+
+
+class RedisBackend:
+    """
+    Общий кэш для нескольких реплик menu_service; требует пакет redis.
+    """
+
+    def __init__(self, url: str):
+        import redis.asyncio as redis
+
+        self._redis = redis.from_url(url, decode_responses=True)
+
+    async def get(self, key: str) -> Optional[str]:
+        return await self._redis.get(key)
+
+    async def set(self, key: str, value: str, ttl: float):
+        await self._redis.set(key, value, px=int(ttl * 1000))
+
+    async def get_version(self) -> int:
+        version = await self._redis.get(VERSION_KEY)
+        if version is None:
+            # setnx, чтобы параллельно стартующие реплики не затёрли уже увеличенную версию
+            await self._redis.setnx(VERSION_KEY, time.time_ns())
+            version = await self._redis.get(VERSION_KEY)
+        return int(version)
+
+    async def incr_version(self) -> int:
+        await self.get_version()
+        return await self._redis.incr(VERSION_KEY)
+
+
+class MenuCache:
+    """
+    Read-through кэш блюд. Все ключи содержат версию меню, поэтому любая запись в меню
+    инвалидирует кэш одним увеличением счётчика версии.
+    """
+
+    def __init__(self, backend, ttl: float):
+        self.backend = backend
+        self.ttl = ttl
+
+    async def version(self) -> int:
+        return await self.backend.get_version()
+
+    async def invalidate(self):
+        await self.backend.incr_version()
+
+    @staticmethod
+    def etag(version: int, key: str) -> str:
+        digest = hashlib.sha1(f"{version}:{key}".encode()).hexdigest()
+        return f'"{digest}"'
+
+    async def get(self, version: int, key: str):
+        value = await self.backend.get(f"menu:{version}:{key}")
+        return json.loads(value) if value is not None else None
+
+    async def set(self, version: int, key: str, value):
+        await self.backend.set(f"menu:{version}:{key}", json.dumps(value), self.ttl)
+
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    if not if_none_match:
+        return False
+    candidates = [tag.strip() for tag in if_none_match.split(",")]
+    return "*" in candidates or etag in candidates or f"W/{etag}" in candidates
+
+
+def create_backend():
+    if MENU_CACHE_BACKEND == "redis":
+        return RedisBackend(MENU_CACHE_REDIS_URL)
+    return MemoryBackend(MENU_CACHE_SIZE)
+
+
+menu_cache = MenuCache(create_backend(), MENU_CACHE_TTL)
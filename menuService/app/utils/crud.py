@@ -1,9 +1,9 @@
-import os
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.future import select
 from sqlalchemy.sql import func
 from app.models import models
 from app.schemas import schemas
+from app.utils import images
 
 # CRUD для получения блюда по ID
 async def get_dish(db: AsyncSession, dish_id: int):
@@ -12,20 +12,27 @@ async def get_dish(db: AsyncSession, dish_id: int):
     return result.scalars().first()
 
 
-async def get_dishes(db: AsyncSession, skip: int = 0, limit: int = 10):
-    # Запрос для получения блюд с пагинацией
-    dishes_query = select(models.Dish).offset(skip).limit(limit)
+async def get_dishes(db: AsyncSession, skip: int = 0, limit: int = 10, after_id: int = None, with_total: bool = True):
+    # Запрос для получения блюд с пагинацией: по курсору (after_id), если он передан, иначе через OFFSET
+    dishes_query = select(models.Dish).order_by(models.Dish.id).limit(limit)
+    if after_id is not None:
+        dishes_query = dishes_query.where(models.Dish.id > after_id)
+    else:
+        dishes_query = dishes_query.offset(skip)
     result = await db.execute(dishes_query)
     dishes = result.scalars().all()
-    
-    # Запрос для подсчёта общего количества блюд
-    count_query = select(func.count()).select_from(models.Dish)
-    total_result = await db.execute(count_query)
-    total = total_result.scalar()
 
+    total = await count_dishes(db) if with_total else None
     return {"dishes": dishes, "total": total}
 
 
+# Запрос для подсчёта общего количества блюд
+async def count_dishes(db: AsyncSession):
+    count_query = select(func.count()).select_from(models.Dish)
+    total_result = await db.execute(count_query)
+    return total_result.scalar()
+
+
 
 # CRUD для создания блюда
 async def create_dish(db: AsyncSession, dish: schemas.DishCreate):
@@ -55,9 +62,13 @@ async def delete_dish(db: AsyncSession, dish_id: int):
     query = select(models.Dish).where(models.Dish.id == dish_id)
     result = await db.execute(query)
     db_dish = result.scalars().first()
-    os.remove(db_dish.image_url)
     if not db_dish:
         return None
+    image_url = db_dish.image_url
     await db.delete(db_dish)
     await db.commit()
+    # Изображения хранятся по хэшу содержимого и могут принадлежать нескольким блюдам
+    shared = await db.execute(select(func.count()).select_from(models.Dish).where(models.Dish.image_url == image_url))
+    if image_url and not shared.scalar():
+        images.remove_image(image_url)
     return True
@@ -0,0 +1,133 @@
+import os
+import time
+from uuid import uuid4
+from sqlalchemy import exc, event
+from sqlalchemy.ext.asyncio import create_async_engine, AsyncEngine
+from sqlalchemy.pool import AsyncAdaptedQueuePool
+
+# Настройки пула соединений к Postgres; одинаковы во всех сервисах, значения задаются окружением каждого из них
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "5"))
+DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", "10"))
+DB_POOL_TIMEOUT = float(os.getenv("DB_POOL_TIMEOUT", "30"))
+DB_POOL_RECYCLE = int(os.getenv("DB_POOL_RECYCLE", "1800"))
+DB_POOL_PRE_PING = os.getenv("DB_POOL_PRE_PING", "true").lower() in ("1", "true", "yes")
+# Кэш подготовленных выражений asyncpg на соединение
+DB_STATEMENT_CACHE_SIZE = int(os.getenv("DB_STATEMENT_CACHE_SIZE", "100"))
+DB_ECHO = os.getenv("DB_ECHO", "false").lower() in ("1", "true", "yes")
+# transaction - за PgBouncer в режиме пулинга транзакций: подготовленные выражения не переживают
+# смену серверного соединения, поэтому кэши выключаются, а имена выражений делаются уникальными
+DB_POOLER_MODE = os.getenv("DB_POOLER_MODE", "session")
+# Сколько секунд после записи процесс читает с основного сервера, чтобы не увидеть отставшую реплику
+DB_REPLICA_STICKY_SECONDS = float(os.getenv("DB_REPLICA_STICKY_SECONDS", "2"))
+
+
+class MeasuredQueuePool(AsyncAdaptedQueuePool):
+    """
+    Пул, который считает выдачи соединений и время ожидания свободного соединения.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.checkouts = 0
+        self.timeouts = 0
+        self.wait_total = 0.0
+        self.wait_max = 0.0
+
+    def _do_get(self):
+        started = time.perf_counter()
+        try:
+            return super()._do_get()
+        except exc.TimeoutError:
+            self.timeouts += 1
+            raise
+        finally:
+            waited = time.perf_counter() - started
+            self.checkouts += 1
+            self.wait_total += waited
+            self.wait_max = max(self.wait_max, waited)
+
+    def recreate(self):
+        # Пул пересоздаётся при разрыве соединений; счётчики переносятся, чтобы метрики не обнулялись
+        pool = super().recreate()
+        pool.checkouts, pool.timeouts = self.checkouts, self.timeouts
+        pool.wait_total, pool.wait_max = self.wait_total, self.wait_max
+        return pool
+
+
+def connect_args() -> dict:
+    if DB_POOLER_MODE == "transaction":
+        return {
+            "statement_cache_size": 0,
+            "prepared_statement_cache_size": 0,
+            "prepared_statement_name_func": lambda: f"__asyncpg_{uuid4()}__",
+        }
+    return {
+        "statement_cache_size": DB_STATEMENT_CACHE_SIZE,
+        "prepared_statement_cache_size": DB_STATEMENT_CACHE_SIZE,
+    }
+
+
+def create_engine(url: str) -> AsyncEngine:
+    return create_async_engine(
+        url,
+        echo=DB_ECHO,
+        poolclass=MeasuredQueuePool,
+        pool_size=DB_POOL_SIZE,
+        max_overflow=DB_MAX_OVERFLOW,
+        pool_timeout=DB_POOL_TIMEOUT,
+        pool_recycle=DB_POOL_RECYCLE,
+        pool_pre_ping=DB_POOL_PRE_PING,
+        connect_args=connect_args(),
+    )
+
+
+class WriteTracker:
+    """
+    Запоминает время последней транзакции с INSERT/UPDATE/DELETE на основном сервере.
+    """
+
+    def __init__(self):
+        self.last_write = float("-inf")
+
+    def attach(self, engine: AsyncEngine):
+        @event.listens_for(engine.sync_engine, "after_cursor_execute")
+        def after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+            if context is not None and (context.isinsert or context.isupdate or context.isdelete):
+                conn.info["wrote"] = True
+
+        @event.listens_for(engine.sync_engine, "commit")
+        def commit(conn):
+            if conn.info.pop("wrote", False):
+                self.last_write = time.monotonic()
+
+        @event.listens_for(engine.sync_engine, "rollback")
+        def rollback(conn):
+            conn.info.pop("wrote", None)
+
+    def recent(self) -> bool:
+        return time.monotonic() - self.last_write < DB_REPLICA_STICKY_SECONDS
+
+
+def create_engines(url: str, replica_url: str = None) -> tuple[AsyncEngine, AsyncEngine]:
+    """
+    Возвращает (основной, для чтения). Без реплики оба указывают на основной сервер.
+    """
+    engine = create_engine(url)
+    if not replica_url or replica_url == url:
+        return engine, engine
+    return engine, create_engine(replica_url)
+
+
+def pool_stats(engine: AsyncEngine) -> dict:
+    pool = engine.sync_engine.pool
+    return {
+        "size": pool.size(),
+        "checked_out": pool.checkedout(),
+        "checked_in": pool.checkedin(),
+        "overflow": pool.overflow(),
+        "max_overflow": DB_MAX_OVERFLOW,
+        "checkouts": pool.checkouts,
+        "timeouts": pool.timeouts,
+        "wait_avg_ms": round(pool.wait_total / pool.checkouts * 1000, 3) if pool.checkouts else 0.0,
+        "wait_max_ms": round(pool.wait_max * 1000, 3),
+    }
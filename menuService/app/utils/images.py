@@ -0,0 +1,140 @@
+import os
+import asyncio
+import hashlib
+import logging
+import tempfile
+from pathlib import Path
+from typing import Optional
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+from fastapi import UploadFile
+
+IMAGES_DIR = Path(os.getenv("IMAGES_DIR", "images"))
+VARIANTS_DIR = IMAGES_DIR / "variants"
+CHUNK_SIZE = 64 * 1024
+
+# Размеры уменьшенных копий (по большей стороне), которые можно запросить через ?size=
+IMAGE_VARIANTS = {"thumb": 320, "medium": 800}
+IMMUTABLE_CACHE_CONTROL = "public, max-age=31536000, immutable"
+IMAGE_IO_THREADS = int(os.getenv("IMAGE_IO_THREADS", "4"))
+IMAGE_WORKERS = int(os.getenv("IMAGE_WORKERS", "2"))
+
+io_pool = ThreadPoolExecutor(max_workers=IMAGE_IO_THREADS, thread_name_prefix="image-io")
+_process_pool: Optional[ProcessPoolExecutor] = None
+_pending_variants: set[asyncio.Task] = set()
+
+logger = logging.getLogger(__name__)
+
+
+def get_process_pool() -> ProcessPoolExecutor:
+    global _process_pool
+    if _process_pool is None:
+        _process_pool = ProcessPoolExecutor(max_workers=IMAGE_WORKERS)
+    return _process_pool
+
+
+def shutdown_pools():
+    if _process_pool is not None:
+        _process_pool.shutdown(wait=False, cancel_futures=True)
+    io_pool.shutdown(wait=False)
+
+
+def variant_path(filename: str, size: str) -> Path:
+    return VARIANTS_DIR / f"{Path(filename).stem}_{size}.webp"
+
+
+def make_variants(source: str, filename: str):
+    """
+    Создаёт WebP-копии изображения. Выполняется в отдельном процессе, чтобы не занимать event loop и GIL.
+    """
+    from PIL import Image
+
+    VARIANTS_DIR.mkdir(parents=True, exist_ok=True)
+    with Image.open(source) as original:
+        original.load()
+        for size, max_side in IMAGE_VARIANTS.items():
+            target = variant_path(filename, size)
+            if target.exists():
+                continue
+            variant = original.copy()
+            variant.thumbnail((max_side, max_side))
+            if variant.mode not in ("RGB", "RGBA"):
+                variant = variant.convert("RGBA")
+            tmp = target.with_suffix(".tmp")
+            variant.save(tmp, "WEBP", quality=80)
+            os.replace(tmp, target)
+
+
+async def save_upload(image: UploadFile) -> str:
+    """
+    Потоково сохраняет загруженный файл под именем sha256 содержимого и возвращает image_url.
+    Одинаковые загрузки не дублируются на диске.
+    """
+    loop = asyncio.get_running_loop()
+    IMAGES_DIR.mkdir(parents=True, exist_ok=True)
+    suffix = Path(image.filename or "").suffix.lower()
+    if not suffix[1:].isalnum():
+        suffix = ""
+
+    fd, tmp_name = tempfile.mkstemp(dir=IMAGES_DIR, suffix=".upload")
+    digest = hashlib.sha256()
+    try:
+        with os.fdopen(fd, "wb") as buffer:
+            while chunk := await image.read(CHUNK_SIZE):
+                digest.update(chunk)
+                await loop.run_in_executor(io_pool, buffer.write, chunk)
+        filename = f"{digest.hexdigest()}{suffix}"
+        target = IMAGES_DIR / filename
+        if target.exists():
+            os.remove(tmp_name)
+        else:
+            os.replace(tmp_name, target)
+    except BaseException:
+        if os.path.exists(tmp_name):
+            os.remove(tmp_name)
+        raise
+
+    schedule_variants(str(target), filename)
+    return str(Path("images") / filename)
+
+
+def schedule_variants(source: str, filename: str):
+    async def run():
+        try:
+            await asyncio.get_running_loop().run_in_executor(get_process_pool(), make_variants, source, filename)
+        except Exception:
+            logger.exception("Failed to create image variants for %s", filename)
+
+    # Копии создаются в фоне; пока их нет, get_image отдаёт оригинал
+    task = asyncio.create_task(run())
+    _pending_variants.add(task)
+    task.add_done_callback(_pending_variants.discard)
+
+
+def resolve_image(filename: str, size: Optional[str] = None) -> Optional[Path]:
+    name = Path(filename).name
+    if size in IMAGE_VARIANTS:
+        variant = variant_path(name, size)
+        if variant.is_file():
+            return variant
+    original = IMAGES_DIR / name
+    return original if original.is_file() else None
+
+
+def cache_headers(path: Path) -> dict:
+    """
+    Файлы с хэшем содержимого в имени никогда не меняются, поэтому кэшируются навсегда.
+    """
+    stem = path.stem
+    digest = stem.rsplit("_", 1)[0] if path.parent == VARIANTS_DIR else stem
+    if len(digest) == 64 and all(c in "0123456789abcdef" for c in digest):
+        return {"ETag": f'"{stem}"', "Cache-Control": IMMUTABLE_CACHE_CONTROL}
+    # Старые файлы с исходными именами могут быть перезаписаны новой загрузкой
+    stat = path.stat()
+    return {"ETag": f'"{stem}-{stat.st_size}-{int(stat.st_mtime)}"', "Cache-Control": "public, max-age=3600"}
+
+
+def remove_image(image_url: str):
+    name = Path(image_url).name
+    for path in [IMAGES_DIR / name] + [variant_path(name, size) for size in IMAGE_VARIANTS]:
+        if path.is_file():
+            os.remove(path)
@@ -0,0 +1,28 @@
+import json
+import base64
+from typing import Optional
+from fastapi import HTTPException
+
+
+def encode_cursor(last_id: int) -> str:
+    """
+    Непрозрачный курсор для keyset-пагинации: клиент передаёт его обратно в параметре after.
+    """
+    raw = json.dumps({"id": last_id}).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_cursor(cursor: Optional[str]) -> Optional[int]:
+    if not cursor:
+        return None
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        return int(json.loads(raw)["id"])
+    except (ValueError, KeyError, TypeError):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+
+def next_cursor(items: list, limit: int) -> Optional[str]:
+    if len(items) < limit:
+        return None
+    return encode_cursor(items[-1].id)
@@ -0,0 +1,48 @@
+"""order status indexes and current status
+
+Revision ID: 8f3b2c1d4e5a
+Revises: 
+Create Date: 2026-10-18 12:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '8f3b2c1d4e5a'
+down_revision: Union[str, None] = None
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # На пустой базе миграции выполняются до create_all, который сам создаст таблицы с колонками и индексами
+    inspector = sa.inspect(op.get_bind())
+    if not (inspector.has_table('orders') and inspector.has_table('order_statuses')):
+        return
+    # Таблицы могли быть созданы через create_all при старте сервисов, поэтому всё создаётся через IF NOT EXISTS
+    op.create_index('ix_order_statuses_order_id_timestamp', 'order_statuses', ['order_id', 'timestamp'], if_not_exists=True)
+    op.create_index('ix_orders_user_id_id', 'orders', ['user_id', 'id'], if_not_exists=True)
+    op.execute('ALTER TABLE orders ADD COLUMN IF NOT EXISTS current_status VARCHAR')
+    op.execute('ALTER TABLE orders ADD COLUMN IF NOT EXISTS current_status_at TIMESTAMP WITHOUT TIME ZONE')
+    op.execute(
+        """
+        UPDATE orders SET current_status = latest.status, current_status_at = latest.timestamp
+        FROM (
+            SELECT DISTINCT ON (order_id) order_id, status, timestamp
+            FROM order_statuses
+            ORDER BY order_id, timestamp DESC, id DESC
+        ) AS latest
+        WHERE orders.id = latest.order_id
+        """
+    )
+
+
+def downgrade() -> None:
+    op.drop_column('orders', 'current_status_at')
+    op.drop_column('orders', 'current_status')
+    op.drop_index('ix_orders_user_id_id', table_name='orders')
+    op.drop_index('ix_order_statuses_order_id_timestamp', table_name='order_statuses')
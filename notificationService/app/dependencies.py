@@ -1,23 +1,31 @@
 import os
-import httpx
-from fastapi import HTTPException, Depends, Security
+from typing import Optional
+from fastapi import HTTPException, Depends, Security, Header, Query
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
-from sqlalchemy.ext.asyncio import create_async_engine, AsyncSession
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import sessionmaker
-from app.utils import crud
+from app.utils import crud, database
 from app.schemas import schemas
+from app.utils import auth
 from dotenv import load_dotenv
 
 load_dotenv()
 
 DATABASE_URL = os.getenv("DATABASE_URL")
-USER_SERVICE_URL = os.getenv("USER_SERVICE_URL", "http://user_service:8000")
+# Реплика для эндпоинтов только для чтения; без неё всё идёт на основной сервер
+DATABASE_REPLICA_URL = os.getenv("DATABASE_REPLICA_URL")
 
-engine = create_async_engine(DATABASE_URL, echo=True)
+engine, read_engine = database.create_engines(DATABASE_URL, DATABASE_REPLICA_URL)
+write_tracker = database.WriteTracker()
+if read_engine is not engine:
+    write_tracker.attach(engine)
 
 AsyncSessionLocal = sessionmaker(
     engine, class_=AsyncSession, autocommit=False, autoflush=False
 )
+AsyncReadSessionLocal = sessionmaker(
+    read_engine, class_=AsyncSession, autocommit=False, autoflush=False
+)
 
 security = HTTPBearer()
 
@@ -25,29 +33,20 @@ async def get_db():
     async with AsyncSessionLocal() as session:
         yield session
 
+async def get_read_db():
+    """
+    Сессия для эндпоинтов только для чтения: реплика, а сразу после записи в этом процессе - основной сервер.
+    """
+    session_factory = AsyncSessionLocal if write_tracker.recent() else AsyncReadSessionLocal
+    async with session_factory() as session:
+        yield session
+
 
 async def validate_token_and_get_user(credentials: HTTPAuthorizationCredentials = Security(security)):
     """
-    Проверяет токен через user_service и возвращает данные о пользователе, если токен валиден.
+    Проверяет токен локально (или через user_service, если так настроено) и возвращает данные о пользователе.
     """
-    token = credentials.credentials
-    async with httpx.AsyncClient() as client:
-        try:
-            response = await client.get(
-                f"{USER_SERVICE_URL}/users/me/",
-                headers={"Authorization": f"Bearer {token}"}
-            )
-            if response.status_code == 200:
-                return response.json()  # Возвращает данные пользователя
-            elif response.status_code == 401:
-                raise HTTPException(status_code=401, detail="Invalid token")
-            else:
-                raise HTTPException(
-                    status_code=response.status_code,
-                    detail=response.text
-                )
-        except httpx.RequestError:
-            raise HTTPException(status_code=503, detail="User service unavailable")
+    return await auth.resolve_user(credentials.credentials)
 
 async def get_current_user(current_user: dict = Depends(validate_token_and_get_user)):
     return current_user
@@ -55,4 +54,18 @@ async def get_current_user(current_user: dict = Depends(validate_token_and_get_u
 async def get_current_admin_user(current_user: dict = Depends(get_current_user)):
     if current_user.get("role") != "admin":
         raise HTTPException(status_code=403, detail="Insufficient rights")
-    return current_user
\ No newline at end of file
+    return current_user
+
+def extract_token(authorization: Optional[str], token: Optional[str]) -> Optional[str]:
+    if authorization and authorization.lower().startswith("bearer "):
+        return authorization[7:]
+    return token
+
+async def get_stream_user(authorization: Optional[str] = Header(None), token: Optional[str] = Query(None)):
+    """
+    EventSource и WebSocket в браузере не умеют передавать заголовки, поэтому токен также принимается в параметре token.
+    """
+    credentials = extract_token(authorization, token)
+    if not credentials:
+        raise HTTPException(status_code=401, detail="Not authenticated")
+    return await auth.resolve_user(credentials)
@@ -2,19 +2,38 @@ from fastapi import FastAPI
 from fastapi.openapi.utils import get_openapi
 from contextlib import asynccontextmanager
 from app.models import models
-from app.dependencies import engine
+from app.dependencies import engine, read_engine
+from app.utils import auth, database
+from app.utils.hub import status_hub
 from app.routers import notification
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     async with engine.begin() as conn:
         await conn.run_sync(models.Base.metadata.create_all)
+    await status_hub.start()
     yield
+    await status_hub.stop()
 
 app = FastAPI(lifespan=lifespan)
 
 app.include_router(notification.router, prefix="/notifications", tags=["Notifications"])
 
+@app.get("/metrics/db-pool", include_in_schema=False)
+async def db_pool_metrics():
+    stats = database.pool_stats(engine)
+    if read_engine is not engine:
+        stats["replica"] = database.pool_stats(read_engine)
+    return stats
+
+@app.get("/metrics/auth-cache", include_in_schema=False)
+async def auth_cache_metrics():
+    return auth.identity_cache.stats()
+
+@app.get("/metrics/status-hub", include_in_schema=False)
+async def status_hub_metrics():
+    return status_hub.stats()
+
 def custom_openapi():
     if app.openapi_schema:
         return app.openapi_schema
@@ -1,5 +1,5 @@
 import enum
-from sqlalchemy import Column, Integer, String, Float, DateTime, ForeignKey, JSON
+from sqlalchemy import Column, Integer, String, Float, DateTime, ForeignKey, JSON, Index
 from sqlalchemy.orm import declarative_base, relationship
 from datetime import datetime
 
@@ -20,6 +20,7 @@ class User(Base):
     password_hash = Column(String)
     address = Column(String)
     role = Column(String, default='user')
+    token_version = Column(Integer, nullable=False, default=0, server_default='0')
 
 
 class Transaction(Base):
@@ -36,6 +37,7 @@ class Transaction(Base):
 
 class Order(Base):
     __tablename__ = "orders"
+    __table_args__ = (Index("ix_orders_user_id_id", "user_id", "id"),)
 
     id = Column(Integer, primary_key=True, index=True)
     transaction_id = Column(Integer, ForeignKey("transactions.id"), unique=True, nullable=False)
@@ -45,12 +47,15 @@ class Order(Base):
     payment_method = Column(String, nullable=False)
     created_at = Column(DateTime, default=datetime.now)
     closed_at = Column(DateTime, nullable=True) 
+    current_status = Column(String, nullable=True)  # Последний статус из order_statuses, обновляется notificationService
+    current_status_at = Column(DateTime, nullable=True)
     transaction = relationship("Transaction", back_populates="order")
     user = relationship("User")
 
 
 class OrderStatus(Base):
     __tablename__ = "order_statuses"
+    __table_args__ = (Index("ix_order_statuses_order_id_timestamp", "order_id", "timestamp"),)
 
     id = Column(Integer, primary_key=True, index=True)
     order_id = Column(Integer, ForeignKey("orders.id"), index=True, nullable=False)
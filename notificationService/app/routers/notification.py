@@ -1,31 +1,69 @@
-from fastapi import APIRouter, Depends, HTTPException
-from typing import List
+import json
+import asyncio
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, WebSocket, WebSocketDisconnect
+from fastapi.responses import StreamingResponse
+from typing import List, Optional
 from sqlalchemy.ext.asyncio import AsyncSession
-from app.dependencies import get_db, get_current_admin_user, get_current_user
-from app.schemas.schemas import OrderStatusCreate, OrderStatusOut, OrderStatusEnum
-from app.utils import crud
+from app.dependencies import AsyncSessionLocal, get_db, get_read_db, get_current_admin_user, get_current_user, get_stream_user, extract_token
+from app.schemas.schemas import OrderStatusCreate, OrderStatusBulkCreate, OrderStatusOut, OrderStatusEnum, OrderCurrentStatusOut
+from app.utils import auth, crud
+from app.utils.hub import status_hub
 
 router = APIRouter()
 
+# Интервал пустых сообщений, которые не дают прокси закрыть простаивающее соединение
+STREAM_HEARTBEAT_INTERVAL = 15
+
+def status_event(status) -> dict:
+    return OrderStatusOut.model_validate(status).model_dump(mode="json")
+
+async def open_status_stream(order_id: int, current_user: dict) -> Optional[list[dict]]:
+    """
+    Проверяет доступ к заказу и возвращает уже известные статусы.
+    Сессия закрывается сразу, чтобы подписчик не удерживал соединение с БД.
+    """
+    async with AsyncSessionLocal() as db:
+        order = await crud.get_user_order(db, order_id, current_user)
+        if not order:
+            return None
+        statuses = await crud.get_order_statuses(db, order_id, {"id": order.user_id})
+        return [status_event(status) for status in statuses]
+
 @router.post("/status/", response_model=OrderStatusOut)
 async def add_order_status(status: OrderStatusCreate, 
                            db: AsyncSession = Depends(get_db), 
                            current_user = Depends(get_current_admin_user)):
     created_status = await crud.create_order_status(db, status)
+    await status_hub.publish([status_event(created_status)])
     return created_status
 
+@router.post("/status/bulk", response_model=List[OrderStatusOut])
+async def add_order_statuses(bulk: OrderStatusBulkCreate,
+                             db: AsyncSession = Depends(get_db),
+                             current_user = Depends(get_current_admin_user)):
+    created_statuses = await crud.create_order_statuses(db, bulk)
+    events = [status_event(status) for status in created_statuses]
+    await status_hub.publish(events)
+    return events
+
 @router.get("/status/{status_id}", response_model=OrderStatusOut)
 async def read_order_status(status_id: int, 
-                            db: AsyncSession = Depends(get_db), 
+                            db: AsyncSession = Depends(get_read_db), 
                             current_user = Depends(get_current_admin_user)):
     status = await crud.get_order_status(db, status_id)
     if not status:
         raise HTTPException(status_code=404, detail="Status not found")
     return status
 
+@router.get("/orders/status/latest", response_model=List[OrderCurrentStatusOut])
+async def read_current_statuses(order_ids: List[int] = Query(..., max_length=500),
+                                db: AsyncSession = Depends(get_read_db),
+                                current_user = Depends(get_current_user)):
+    return await crud.get_current_statuses(db, order_ids, current_user)
+
 @router.get("/orders/{order_id}/status/", response_model=List[OrderStatusOut])
 async def read_order_statuses(order_id: int, 
-                              db: AsyncSession = Depends(get_db), 
+                              db: AsyncSession = Depends(get_read_db), 
                               current_user = Depends(get_current_user)):
     statuses = await crud.get_order_statuses(db, order_id, current_user)
     return statuses
@@ -38,4 +76,68 @@ async def update_order_status(status_id: int,
     updated_status = await crud.update_order_status(db, status_id, new_status)
     if not updated_status:
         raise HTTPException(status_code=404, detail="Status not found")
-    return updated_status
\ No newline at end of file
+    await status_hub.publish([status_event(updated_status)])
+    return updated_status
+
+@router.get("/orders/{order_id}/status/stream")
+async def stream_order_statuses(order_id: int,
+                                request: Request,
+                                current_user = Depends(get_stream_user)):
+    initial = await open_status_stream(order_id, current_user)
+    if initial is None:
+        raise HTTPException(status_code=404, detail="Order not found")
+
+    async def events():
+        with status_hub.subscribe(order_id) as queue:
+            for event in initial:
+                yield f"data: {json.dumps(event)}\n\n"
+            while not await request.is_disconnected():
+                try:
+                    event = await asyncio.wait_for(queue.get(), timeout=STREAM_HEARTBEAT_INTERVAL)
+                except asyncio.TimeoutError:
+                    yield ": ping\n\n"
+                    continue
+                yield f"data: {json.dumps(event)}\n\n"
+
+    return StreamingResponse(events(), media_type="text/event-stream", headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
+@router.websocket("/orders/{order_id}/status/ws")
+async def websocket_order_statuses(websocket: WebSocket, order_id: int, token: Optional[str] = None):
+    try:
+        credentials = extract_token(websocket.headers.get("authorization"), token)
+        if not credentials:
+            raise HTTPException(status_code=401, detail="Not authenticated")
+        current_user = await auth.resolve_user(credentials)
+        initial = await open_status_stream(order_id, current_user)
+    except HTTPException:
+        await websocket.close(code=1008)
+        return
+    if initial is None:
+        await websocket.close(code=1008)
+        return
+
+    await websocket.accept()
+    with status_hub.subscribe(order_id) as queue:
+        # Отдельная задача читает входящие сообщения, чтобы вовремя заметить закрытие соединения клиентом
+        receiver = asyncio.create_task(drain_websocket(websocket))
+        try:
+            for event in initial:
+                await websocket.send_json(event)
+            while not receiver.done():
+                getter = asyncio.create_task(queue.get())
+                done, _ = await asyncio.wait({getter, receiver}, return_when=asyncio.FIRST_COMPLETED)
+                if getter not in done:
+                    getter.cancel()
+                    break
+                await websocket.send_json(getter.result())
+        except WebSocketDisconnect:
+            pass
+        finally:
+            receiver.cancel()
+
+async def drain_websocket(websocket: WebSocket):
+    try:
+        while True:
+            await websocket.receive_text()
+    except WebSocketDisconnect:
+        pass
\ No newline at end of file
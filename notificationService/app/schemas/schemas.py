@@ -1,6 +1,7 @@
 from enum import Enum
-from pydantic import BaseModel
+from pydantic import BaseModel, Field
 from datetime import datetime
+from typing import Optional
 
 class OrderStatusEnum(str, Enum):
     preparing = "preparing"
@@ -12,6 +13,9 @@ class OrderStatusCreate(BaseModel):
     order_id: int
     status: OrderStatusEnum
 
+class OrderStatusBulkCreate(BaseModel):
+    items: list[OrderStatusCreate] = Field(..., min_length=1, max_length=500)
+
 class OrderStatusOut(BaseModel):
     id: int
     order_id: int
@@ -19,4 +23,9 @@ class OrderStatusOut(BaseModel):
     timestamp: datetime
 
     class Config:
-        from_attributes = True
\ No newline at end of file
+        from_attributes = True
+
+class OrderCurrentStatusOut(BaseModel):
+    order_id: int
+    status: Optional[OrderStatusEnum] = None
+    timestamp: Optional[datetime] = None
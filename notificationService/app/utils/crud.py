@@ -1,8 +1,10 @@
 from sqlalchemy.ext.asyncio import AsyncSession
+from datetime import datetime
+from sqlalchemy import insert, update
 from sqlalchemy.future import select
 from fastapi import HTTPException
 from app.models.models import OrderStatus, Order
-from app.schemas.schemas import OrderStatusCreate
+from app.schemas.schemas import OrderStatusCreate, OrderStatusBulkCreate, OrderStatusOut
 
 
 async def create_order_status(db: AsyncSession, status: OrderStatusCreate):
@@ -14,13 +16,44 @@ async def create_order_status(db: AsyncSession, status: OrderStatusCreate):
 
     db_status = OrderStatus(
         order_id=status.order_id,
-        status=status.status
+        status=status.status,
+        timestamp=datetime.now()
     )
     db.add(db_status)
+    # Текущий статус денормализован в orders и обновляется в той же транзакции
+    order.current_status = db_status.status
+    order.current_status_at = db_status.timestamp
     await db.commit()
     await db.refresh(db_status)
     return db_status
 
+async def create_order_statuses(db: AsyncSession, bulk: OrderStatusBulkCreate):
+    order_ids = {item.order_id for item in bulk.items}
+    result = await db.execute(select(Order.id).where(Order.id.in_(order_ids)))
+    missing_ids = sorted(order_ids - set(result.scalars().all()))
+    if missing_ids:
+        raise HTTPException(status_code=404, detail=f"Orders with ids {missing_ids} not found")
+
+    now = datetime.now()
+    # Все строки истории вставляются одним INSERT ... RETURNING
+    statuses = (await db.scalars(
+        insert(OrderStatus).returning(OrderStatus),
+        [{"order_id": item.order_id, "status": item.status.value, "timestamp": now} for item in bulk.items],
+    )).all()
+
+    # Текущий статус заказа — последний переданный для него элемент; один UPDATE на каждое значение статуса
+    current = {item.order_id: item.status.value for item in bulk.items}
+    by_status = {}
+    for order_id, status in current.items():
+        by_status.setdefault(status, []).append(order_id)
+    for status, ids in by_status.items():
+        await db.execute(update(Order).where(Order.id.in_(ids)).values(current_status=status, current_status_at=now))
+
+    # Ответ собирается до commit, иначе атрибуты вставленных строк пришлось бы перечитывать из БД
+    created_statuses = [OrderStatusOut.model_validate(status) for status in statuses]
+    await db.commit()
+    return created_statuses
+
 async def get_order_status(db: AsyncSession, status_id: int):
     result = await db.execute(select(OrderStatus).where(OrderStatus.id == status_id))
     return result.scalars().first()
@@ -28,14 +61,41 @@ async def get_order_status(db: AsyncSession, status_id: int):
 async def get_order_statuses(db: AsyncSession, order_id: int, current_user: dict):
     user_id = current_user.get("id")
     result = await db.execute(
-        select(OrderStatus).join(Order, OrderStatus.order_id == Order.id).where(OrderStatus.order_id == order_id, Order.user_id == user_id)
+        select(OrderStatus).join(Order, OrderStatus.order_id == Order.id)
+        .where(OrderStatus.order_id == order_id, Order.user_id == user_id)
+        .order_by(OrderStatus.timestamp, OrderStatus.id)
     )
     return result.scalars().all()
 
+async def get_current_statuses(db: AsyncSession, order_ids: list[int], current_user: dict):
+    # Один запрос по первичному ключу orders вместо выборки всей истории статусов
+    query = select(Order.id, Order.current_status, Order.current_status_at).where(Order.id.in_(order_ids))
+    if current_user.get("role") != "admin":
+        query = query.where(Order.user_id == current_user.get("id"))
+    result = await db.execute(query)
+    return [
+        {"order_id": order_id, "status": status, "timestamp": timestamp}
+        for order_id, status, timestamp in result.all()
+    ]
+
 async def update_order_status(db: AsyncSession, status_id: int, new_status: str):
     status = await get_order_status(db, status_id)
     if status:
         status.status = new_status
+        # Если правится последний статус заказа, текущий статус в orders меняется вместе с ним
+        latest = await db.execute(
+            select(OrderStatus.id).where(OrderStatus.order_id == status.order_id)
+            .order_by(OrderStatus.timestamp.desc(), OrderStatus.id.desc()).limit(1)
+        )
+        if latest.scalar() == status.id:
+            await db.execute(update(Order).where(Order.id == status.order_id).values(current_status=new_status))
         await db.commit()
         await db.refresh(status)
-    return status
\ No newline at end of file
+    return status
+
+async def get_user_order(db: AsyncSession, order_id: int, current_user: dict):
+    query = select(Order).where(Order.id == order_id)
+    if current_user.get("role") != "admin":
+        query = query.where(Order.user_id == current_user.get("id"))
+    result = await db.execute(query)
+    return result.scalars().first()
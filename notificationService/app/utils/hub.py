@@ -0,0 +1,159 @@
+import os
+import json
+import asyncio
+import logging
+from typing import Optional
+from collections import defaultdict
+from contextlib import contextmanager
+
+# memory — рассылка внутри процесса, postgres — через LISTEN/NOTIFY между всеми репликами
+STATUS_HUB_BACKEND = os.getenv("STATUS_HUB_BACKEND", "memory")
+STATUS_HUB_CHANNEL = "order_status"
+NOTIFY_CHUNK_SIZE = 40
+# Размер очереди одного подписчика: медленный клиент теряет старые события, а не тормозит рассылку
+STATUS_HUB_QUEUE_SIZE = int(os.getenv("STATUS_HUB_QUEUE_SIZE", "16"))
+# Переподключение LISTEN-соединения: задержка растёт от BASE до MAX, проверка живости раз в HEALTH_INTERVAL секунд
+STATUS_HUB_RECONNECT_BASE = float(os.getenv("STATUS_HUB_RECONNECT_BASE", "1"))
+STATUS_HUB_RECONNECT_MAX = float(os.getenv("STATUS_HUB_RECONNECT_MAX", "30"))
+STATUS_HUB_HEALTH_INTERVAL = float(os.getenv("STATUS_HUB_HEALTH_INTERVAL", "15"))
+
+logger = logging.getLogger(__name__)
+
+
+class StatusHub:
+    """
+    Рассылает изменения статусов заказов подписчикам SSE/WebSocket, сгруппированным по order_id.
+    """
+
+    def __init__(self, backend: str, dsn: str = None):
+        self.backend = backend
+        self.dsn = dsn
+        self._subscribers: dict[int, set[asyncio.Queue]] = defaultdict(set)
+        self._conn = None
+        self._lock = asyncio.Lock()
+        self._listen_task: Optional[asyncio.Task] = None
+        self.reconnects = 0
+        self.publish_errors = 0
+
+    async def start(self):
+        if self.backend != "postgres":
+            return
+        self._listen_task = asyncio.create_task(self._listen())
+
+    async def stop(self):
+        if self._listen_task is not None:
+            self._listen_task.cancel()
+            try:
+                await self._listen_task
+            except asyncio.CancelledError:
+                pass
+            self._listen_task = None
+        await self._disconnect()
+
+    async def _listen(self):
+        """
+        Держит LISTEN-соединение: после обрыва или неудачной проверки переподключается
+        с экспоненциальной задержкой и заново подписывается на канал.
+        События, отправленные другими репликами за время обрыва, теряются.
+        """
+        import asyncpg
+
+        delay = STATUS_HUB_RECONNECT_BASE
+        while True:
+            try:
+                lost = asyncio.Event()
+                conn = self._conn = await asyncpg.connect(self.dsn)
+                conn.add_termination_listener(lambda _: lost.set())
+                await conn.add_listener(STATUS_HUB_CHANNEL, self._on_notify)
+                delay = STATUS_HUB_RECONNECT_BASE
+                while not lost.is_set():
+                    try:
+                        await asyncio.wait_for(lost.wait(), timeout=STATUS_HUB_HEALTH_INTERVAL)
+                    except asyncio.TimeoutError:
+                        # Обрыв без закрытия TCP-соединения не вызывает termination listener
+                        async with self._lock:
+                            await asyncio.wait_for(conn.execute("SELECT 1"), timeout=STATUS_HUB_HEALTH_INTERVAL)
+                logger.warning("Status hub LISTEN connection lost, reconnecting")
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                logger.exception("Status hub LISTEN connection failed, retrying in %.1fs", delay)
+            await self._disconnect()
+            self.reconnects += 1
+            await asyncio.sleep(delay)
+            delay = min(delay * 2, STATUS_HUB_RECONNECT_MAX)
+
+    async def _disconnect(self):
+        conn, self._conn = self._conn, None
+        if conn is not None and not conn.is_closed():
+            try:
+                await conn.close(timeout=5)
+            except Exception:
+                conn.terminate()
+
+    @contextmanager
+    def subscribe(self, order_id: int):
+        queue = asyncio.Queue(maxsize=STATUS_HUB_QUEUE_SIZE)
+        self._subscribers[order_id].add(queue)
+        try:
+            yield queue
+        finally:
+            self._subscribers[order_id].discard(queue)
+            if not self._subscribers[order_id]:
+                del self._subscribers[order_id]
+
+    async def publish(self, events: list[dict]):
+        """
+        Вызывается после фиксации изменений в БД, поэтому не выбрасывает исключений: ошибка рассылки
+        не должна превращать уже сохранённое изменение в ответ 500.
+        """
+        if not events:
+            return
+        # Без LISTEN-соединения (memory или обрыв) события получают хотя бы подписчики этого процесса
+        conn = self._conn
+        if conn is None:
+            self._fan_out(events)
+            return
+        # Событие вернётся и в этот процесс через add_listener, поэтому локально не рассылается.
+        # Payload NOTIFY ограничен 8000 байт, поэтому большие пачки отправляются частями
+        start = 0
+        try:
+            async with self._lock:
+                for start in range(0, len(events), NOTIFY_CHUNK_SIZE):
+                    chunk = events[start:start + NOTIFY_CHUNK_SIZE]
+                    await conn.execute("SELECT pg_notify($1, $2)", STATUS_HUB_CHANNEL, json.dumps(chunk))
+        except Exception:
+            self.publish_errors += 1
+            logger.exception("Failed to publish %d status events", len(events) - start)
+            self._fan_out(events[start:])
+
+    def _on_notify(self, connection, pid, channel, payload):
+        self._fan_out(json.loads(payload))
+
+    def _fan_out(self, events: list[dict]):
+        for event in events:
+            for queue in self._subscribers.get(event["order_id"], ()):
+                if queue.full():
+                    queue.get_nowait()
+                queue.put_nowait(event)
+
+    def stats(self) -> dict:
+        return {
+            "backend": self.backend,
+            "orders": len(self._subscribers),
+            "subscribers": sum(len(queues) for queues in self._subscribers.values()),
+            "connected": self._conn is not None,
+            "reconnects": self.reconnects,
+            "publish_errors": self.publish_errors,
+        }
+
+
+def create_hub() -> StatusHub:
+    # asyncpg ожидает обычный postgresql:// DSN без указания драйвера SQLAlchemy.
+    # LISTEN не работает через пулер в режиме транзакций, поэтому для него можно указать прямой адрес
+    url = os.getenv("STATUS_HUB_DATABASE_URL") or os.getenv("DATABASE_URL") or ""
+    dsn = url.replace("postgresql+asyncpg://", "postgresql://", 1)
+    return StatusHub(STATUS_HUB_BACKEND, dsn)
+
+
+status_hub = create_hub()
@@ -1,23 +1,30 @@
 import os
-import httpx
 from fastapi import HTTPException, Depends, Security
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
-from sqlalchemy.ext.asyncio import create_async_engine, AsyncSession
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.future import select
 from sqlalchemy.orm import sessionmaker
 from app.models.models import User
+from app.utils import auth, database
 from dotenv import load_dotenv
 
 load_dotenv()
 
 DATABASE_URL = os.getenv("DATABASE_URL")
-USER_SERVICE_URL = os.getenv("USER_SERVICE_URL", "http://user_service:8000")
+# Реплика для эндпоинтов только для чтения; без неё всё идёт на основной сервер
+DATABASE_REPLICA_URL = os.getenv("DATABASE_REPLICA_URL")
 
-engine = create_async_engine(DATABASE_URL, echo=True)
+engine, read_engine = database.create_engines(DATABASE_URL, DATABASE_REPLICA_URL)
+write_tracker = database.WriteTracker()
+if read_engine is not engine:
+    write_tracker.attach(engine)
 
 AsyncSessionLocal = sessionmaker(
     engine, class_=AsyncSession, autocommit=False, autoflush=False
 )
+AsyncReadSessionLocal = sessionmaker(
+    read_engine, class_=AsyncSession, autocommit=False, autoflush=False
+)
 
 security = HTTPBearer()
 
@@ -25,29 +32,20 @@ async def get_db():
     async with AsyncSessionLocal() as session:
         yield session
 
+async def get_read_db():
+    """
+    Сессия для эндпоинтов только для чтения: реплика, а сразу после записи в этом процессе - основной сервер.
+    """
+    session_factory = AsyncSessionLocal if write_tracker.recent() else AsyncReadSessionLocal
+    async with session_factory() as session:
+        yield session
+
 
 async def validate_token_and_get_user(credentials: HTTPAuthorizationCredentials = Security(security)):
     """
-    Проверяет токен через user_service и возвращает данные о пользователе, если токен валиден.
+    Проверяет токен локально (или через user_service, если так настроено) и возвращает данные о пользователе.
     """
-    token = credentials.credentials
-    async with httpx.AsyncClient() as client:
-        try:
-            response = await client.get(
-                f"{USER_SERVICE_URL}/users/me/",
-                headers={"Authorization": f"Bearer {token}"}
-            )
-            if response.status_code == 200:
-                return response.json()  # Возвращает данные пользователя
-            elif response.status_code == 401:
-                raise HTTPException(status_code=401, detail="Invalid token")
-            else:
-                raise HTTPException(
-                    status_code=response.status_code,
-                    detail=response.text
-                )
-        except httpx.RequestError:
-            raise HTTPException(status_code=503, detail="User service unavailable")
+    return await auth.resolve_user(credentials.credentials)
         
 async def get_user(db: AsyncSession, user_id: int):
 
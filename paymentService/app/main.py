@@ -1,7 +1,11 @@
+import asyncio
 from fastapi import FastAPI
 from contextlib import asynccontextmanager
 from app.models.models import Base
-from app.dependencies import engine
+from app.dependencies import engine, read_engine
+from app.utils import auth, database
+from app.utils.settlement import PAYMENT_SETTLEMENT, settlement_workers
+from app.utils.idempotency import cleanup_expired_keys
 from app.routers import payment
 from fastapi.openapi.utils import get_openapi
 
@@ -9,12 +13,28 @@ from fastapi.openapi.utils import get_openapi
 async def lifespan(app: FastAPI):
     async with engine.begin() as conn:
         await conn.run_sync(Base.metadata.create_all)
+    if PAYMENT_SETTLEMENT == "async":
+        settlement_workers.start()
+    cleanup_task = asyncio.create_task(cleanup_expired_keys())
     yield
+    cleanup_task.cancel()
+    await settlement_workers.stop()
 
 app = FastAPI(lifespan=lifespan)
 
 app.include_router(payment.router, prefix="/payments", tags=["Payments"])
 
+@app.get("/metrics/db-pool", include_in_schema=False)
+async def db_pool_metrics():
+    stats = database.pool_stats(engine)
+    if read_engine is not engine:
+        stats["replica"] = database.pool_stats(read_engine)
+    return stats
+
+@app.get("/metrics/auth-cache", include_in_schema=False)
+async def auth_cache_metrics():
+    return auth.identity_cache.stats()
+
 
 def custom_openapi():
     if app.openapi_schema:
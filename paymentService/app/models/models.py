@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, Float, DateTime, ForeignKey, JSON
+from sqlalchemy import Column, Integer, String, Float, DateTime, ForeignKey, JSON, Index
 from sqlalchemy.orm import declarative_base, relationship
 from datetime import datetime
 
@@ -13,6 +13,7 @@ class User(Base):
     password_hash = Column(String)
     address = Column(String)
     role = Column(String, default='user')
+    token_version = Column(Integer, nullable=False, default=0, server_default='0')
 
 
 class Transaction(Base):
@@ -29,6 +30,7 @@ class Transaction(Base):
 
 class Order(Base):
     __tablename__ = "orders"
+    __table_args__ = (Index("ix_orders_user_id_id", "user_id", "id"),)
 
     id = Column(Integer, primary_key=True, index=True)
     transaction_id = Column(Integer, ForeignKey("transactions.id"), unique=True, nullable=False)
@@ -38,6 +40,8 @@ class Order(Base):
     payment_method = Column(String, nullable=False)  # Ограничение на 'cash' и 'card'
     created_at = Column(DateTime, default=datetime.now)
     closed_at = Column(DateTime, nullable=True) 
+    current_status = Column(String, nullable=True)  # Последний статус из order_statuses, обновляется notificationService
+    current_status_at = Column(DateTime, nullable=True)
     transaction = relationship("Transaction", back_populates="order")
     user = relationship("User")  # Предполагается, что модель User определена в другом сервисе
 
@@ -48,4 +52,29 @@ class Dish(Base):
     name = Column(String, unique=True, index=True)
     description = Column(String)
     price = Column(Float)
-    image_url = Column(String)
\ No newline at end of file
+    image_url = Column(String)
+
+class SettlementJob(Base):
+    __tablename__ = "settlement_jobs"
+
+    id = Column(Integer, primary_key=True, index=True)
+    transaction_id = Column(Integer, ForeignKey("transactions.id"), unique=True, nullable=False)
+    attempts = Column(Integer, default=0, nullable=False)
+    created_at = Column(DateTime, default=datetime.now)
+    # Задание берётся в работу не раньше run_after; после ошибки провайдера сдвигается с экспоненциальной задержкой
+    run_after = Column(DateTime, default=datetime.now, nullable=False, index=True)
+    # Аренда: пока она не истекла, задание обрабатывает один воркер; после падения воркера задание снова доступно
+    locked_until = Column(DateTime, nullable=True)
+
+
+class IdempotencyKey(Base):
+    __tablename__ = "idempotency_keys"
+
+    key = Column(String(64), primary_key=True)  # sha256 от пользователя, операции и заголовка Idempotency-Key
+    request_hash = Column(String(64), nullable=False)  # sha256 канонического тела запроса
+    status_code = Column(Integer, nullable=True)  # NULL, пока исходный запрос ещё выполняется
+    response = Column(JSON, nullable=True)
+    headers = Column(JSON, nullable=True)  # заголовки ответа, которые повторяются вместе с телом (Location)
+    # Срок резервирования: если исходный запрос не завершился к этому времени (упал процесс), ключ можно занять снова
+    locked_until = Column(DateTime, nullable=False)
+    created_at = Column(DateTime, default=datetime.now, index=True)
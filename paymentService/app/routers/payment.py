@@ -1,30 +1,49 @@
-from fastapi import APIRouter, Depends, HTTPException
-from typing import List
+from fastapi import APIRouter, Depends, HTTPException, Header, Response
+from typing import List, Optional
 from sqlalchemy.ext.asyncio import AsyncSession
-from app.dependencies import get_db, get_current_admin_user, get_current_user
+from app.dependencies import get_db, get_read_db, get_current_admin_user, get_current_user
 from app.schemas.schemas import TransactionCreate, TransactionOut, OrderCreate, OrderOut
 from app.utils import crud
-from asyncio import sleep
+from app.utils.pagination import decode_cursor, next_cursor
+from app.utils.providers import PaymentProvider, get_payment_provider
+from app.utils.settlement import PAYMENT_SETTLEMENT, settlement_workers
+from app.utils.idempotency import run_idempotent
 from app.dependencies import get_user
 
 router = APIRouter()
 
-@router.post("/pay/", response_model=TransactionOut)
-async def process_payment(transaction: TransactionCreate, db: AsyncSession = Depends(get_db), current_user: dict = Depends(get_current_user)):
+@router.post("/pay/", response_model=TransactionOut, status_code=202)
+async def process_payment(transaction: TransactionCreate,
+                          response: Response,
+                          idempotency_key: Optional[str] = Header(None, alias="Idempotency-Key"),
+                          db: AsyncSession = Depends(get_db),
+                          current_user: dict = Depends(get_current_user),
+                          provider: PaymentProvider = Depends(get_payment_provider)):
 
-    result = await get_user(user_id=transaction.user_id, db=db)
-
-    if result.id != current_user.get("id"):
+    if transaction.user_id != current_user.get("id"):
         raise HTTPException(status_code=403, detail="You can't create transaction for another user")
 
-    await sleep(1)
-    created_transaction = await crud.create_transaction(db, transaction)
-    # Обновляем статус транзакции
-    await crud.update_transaction_status(db, created_transaction.id, "completed")
-    return created_transaction
+    if PAYMENT_SETTLEMENT == "sync":
+        async def settle():
+            # Транзакция записывается один раз, сразу с итоговым статусом от провайдера
+            status = await provider.charge(transaction)
+            return await crud.create_transaction(db, transaction, status=status)
+
+        response.status_code = 200
+        return await run_idempotent(db, idempotency_key, current_user.get("id"), "pay", transaction, 200, TransactionOut, settle)
+
+    async def enqueue():
+        # Транзакция сохраняется как pending и проводится воркерами; статус клиент получает через GET /pay/{id}
+        created_transaction = await crud.enqueue_transaction(db, transaction)
+        settlement_workers.notify()
+        response.headers["Location"] = f"/payments/pay/{created_transaction.id}"
+        return created_transaction
+
+    return await run_idempotent(db, idempotency_key, current_user.get("id"), "pay", transaction, 202, TransactionOut, enqueue,
+                                response=response)
 
 @router.get("/pay/{transaction_id}", response_model=TransactionOut)
-async def read_transaction(transaction_id: int, db: AsyncSession = Depends(get_db), current_user: dict = Depends(get_current_user)):
+async def read_transaction(transaction_id: int, db: AsyncSession = Depends(get_read_db), current_user: dict = Depends(get_current_user)):
     transaction = await crud.get_transaction(db, current_user, transaction_id)
     if not transaction:
         raise HTTPException(status_code=404, detail="Transaction not found")
@@ -32,35 +51,48 @@ async def read_transaction(transaction_id: int, db: AsyncSession = Depends(get_d
 
 @router.get("/pay/", response_model=List[TransactionOut])
 async def read_transaction( 
-                            db: AsyncSession = Depends(get_db),
+                            response: Response,
+                            db: AsyncSession = Depends(get_read_db),
                             current_user: dict = Depends(get_current_user),
                             skip: int = 0,
-                            limit: int = 10):
-    transaction = await crud.get_transactions(db, current_user, skip=skip, limit=limit)
+                            limit: int = 10,
+                            after: Optional[str] = None):
+    transaction = await crud.get_transactions(db, current_user, skip=skip, limit=limit, after_id=decode_cursor(after))
     if not transaction:
         raise HTTPException(status_code=404, detail="Transaction not found")
+    cursor = next_cursor(transaction, limit)
+    if cursor:
+        response.headers["X-Next-Cursor"] = cursor
     return transaction
 
 @router.post("/orders/", response_model=OrderOut)
-async def create_order(order: OrderCreate, db: AsyncSession = Depends(get_db), current_user: dict = Depends(get_current_user)):
+async def create_order(order: OrderCreate,
+                       idempotency_key: Optional[str] = Header(None, alias="Idempotency-Key"),
+                       db: AsyncSession = Depends(get_db),
+                       current_user: dict = Depends(get_current_user)):
 
     result = await get_user(user_id=order.user_id, db=db)
     if result.id != current_user.get("id"):
         raise HTTPException(status_code=403, detail="You can't create order for another user")
-        
-    created_order = await crud.create_order(db, order, current_user=current_user)
-    return created_order
+
+    async def create():
+        return await crud.create_order(db, order, current_user=current_user)
+
+    return await run_idempotent(db, idempotency_key, current_user.get("id"), "orders", order, 200, OrderOut, create)
 
 @router.get("/orders/{order_id}", response_model=OrderOut)
-async def read_order(order_id: int, db: AsyncSession = Depends(get_db), current_user: dict = Depends(get_current_admin_user)):
+async def read_order(order_id: int, db: AsyncSession = Depends(get_read_db), current_user: dict = Depends(get_current_admin_user)):
     order = await crud.get_order(db, order_id)
     if not order:
         raise HTTPException(status_code=404, detail="Order not found")
     return order
 
 @router.get("/orders/", response_model=list[OrderOut])
-async def read_orders(skip: int = 0, limit: int = 10, db: AsyncSession = Depends(get_db), current_user: dict = Depends(get_current_user)):
-    orders = await crud.get_orders(db=db, current_user=current_user, skip=skip, limit=limit)
+async def read_orders(response: Response, skip: int = 0, limit: int = 10, after: Optional[str] = None, db: AsyncSession = Depends(get_read_db), current_user: dict = Depends(get_current_user)):
+    orders = await crud.get_orders(db=db, current_user=current_user, skip=skip, limit=limit, after_id=decode_cursor(after))
+    cursor = next_cursor(orders, limit)
+    if cursor:
+        response.headers["X-Next-Cursor"] = cursor
     return orders
 
 @router.put("/orders/{order_id}/status/", response_model=OrderOut)
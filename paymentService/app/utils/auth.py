@@ -0,0 +1,171 @@
+import os
+import time
+import asyncio
+import hashlib
+from collections import OrderedDict
+import httpx
+from fastapi import HTTPException
+from jose import JWTError, jwt
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# Должны совпадать с настройками userService/app/dependencies.py
+SECRET_KEY = os.getenv("SECRET_KEY", "your-secret-key")
+ALGORITHM = "HS256"
+USER_SERVICE_URL = os.getenv("USER_SERVICE_URL", "http://user_service:8000")
+
+# local — токен проверяется на месте по подписи и claims, remote — всегда через user_service.
+# В режиме local версия токена (ver) не сверяется, поэтому отзыв через /users/token/revoke-all
+# действует здесь только после истечения access-токена
+AUTH_MODE = os.getenv("AUTH_MODE", "local")
+# Обращаться к user_service, если в токене нет нужных claims (например, токен выпущен до их появления)
+AUTH_REMOTE_FALLBACK = os.getenv("AUTH_REMOTE_FALLBACK", "false").lower() in ("1", "true", "yes")
+
+# Кэш результатов /users/me/claims для режима remote
+AUTH_CACHE_SIZE = int(os.getenv("AUTH_CACHE_SIZE", "10000"))
+AUTH_CACHE_TTL = float(os.getenv("AUTH_CACHE_TTL", "60"))
+
+credentials_exception = HTTPException(status_code=401, detail="Invalid token")
+
+
+class IdentityCache:
+    """
+    LRU-кэш пользователей по хэшу токена. Запись живёт не дольше AUTH_CACHE_TTL и не дольше exp токена,
+    а одновременные запросы с одним токеном ждут единственного обращения к user_service.
+    """
+
+    def __init__(self, max_size: int, ttl: float):
+        self.max_size = max_size
+        self.ttl = ttl
+        self._entries: OrderedDict[str, tuple[float, dict]] = OrderedDict()
+        self._in_flight: dict[str, asyncio.Task] = {}
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.coalesced = 0
+
+    @staticmethod
+    def key(token: str) -> str:
+        return hashlib.sha256(token.encode()).hexdigest()
+
+    def expires_at(self, token: str) -> float:
+        now = time.time()
+        try:
+            exp = jwt.get_unverified_claims(token).get("exp")
+        except JWTError:
+            exp = None
+        if exp is None:
+            return now + self.ttl
+        return min(now + self.ttl, float(exp))
+
+    def get(self, key: str):
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        expires_at, user = entry
+        if expires_at <= time.time():
+            del self._entries[key]
+            self.evictions += 1
+            return None
+        self._entries.move_to_end(key)
+        return user
+
+    def put(self, key: str, user: dict, expires_at: float):
+        if expires_at <= time.time():
+            return
+        self._entries[key] = (expires_at, user)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    async def get_or_fetch(self, token: str, fetch) -> dict:
+        key = self.key(token)
+        user = self.get(key)
+        if user is not None:
+            self.hits += 1
+            return user
+        task = self._in_flight.get(key)
+        if task is None:
+            self.misses += 1
+            task = asyncio.create_task(self._fetch(key, token, fetch))
+            self._in_flight[key] = task
+        else:
+            self.coalesced += 1
+        # shield: отмена одного из ожидающих запросов не должна отменять общий запрос к user_service
+        return await asyncio.shield(task)
+
+    async def _fetch(self, key: str, token: str, fetch) -> dict:
+        try:
+            user = await fetch(token)
+            self.put(key, user, self.expires_at(token))
+            return user
+        finally:
+            self._in_flight.pop(key, None)
+
+    def stats(self) -> dict:
+        return {
+            "size": len(self._entries),
+            "max_size": self.max_size,
+            "ttl": self.ttl,
+            "hits": self.hits,
+            "misses": self.misses,
+            "coalesced": self.coalesced,
+            "evictions": self.evictions,
+            "in_flight": len(self._in_flight),
+        }
+
+
+identity_cache = IdentityCache(AUTH_CACHE_SIZE, AUTH_CACHE_TTL)
+
+
+def decode_token(token: str) -> dict:
+    try:
+        return jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
+    except JWTError:
+        raise credentials_exception
+
+
+def user_from_claims(payload: dict):
+    """
+    Собирает данные пользователя из claims токена или возвращает None, если их недостаточно.
+    """
+    if payload.get("id") is None or not payload.get("role"):
+        return None
+    return {
+        "id": payload["id"],
+        "username": payload.get("sub"),
+        "email": payload.get("email"),
+        "role": payload["role"],
+    }
+
+
+async def fetch_remote_user(token: str) -> dict:
+    """
+    Проверяет токен через user_service и возвращает данные о пользователе, если токен валиден.
+    """
+    async with httpx.AsyncClient() as client:
+        try:
+            response = await client.get(
+                f"{USER_SERVICE_URL}/users/me/claims",
+                headers={"Authorization": f"Bearer {token}"}
+            )
+        except httpx.RequestError:
+            raise HTTPException(status_code=503, detail="User service unavailable")
+    if response.status_code == 200:
+        return response.json()
+    elif response.status_code == 401:
+        raise credentials_exception
+    raise HTTPException(status_code=response.status_code, detail=response.text)
+
+
+async def resolve_user(token: str) -> dict:
+    if AUTH_MODE == "remote":
+        return await identity_cache.get_or_fetch(token, fetch_remote_user)
+    user = user_from_claims(decode_token(token))
+    if user:
+        return user
+    if AUTH_REMOTE_FALLBACK:
+        return await identity_cache.get_or_fetch(token, fetch_remote_user)
+    raise credentials_exception
@@ -1,22 +1,91 @@
 import datetime 
-from sqlalchemy import select, and_
+from sqlalchemy import select, update, delete, and_, or_
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.exc import IntegrityError
 from fastapi import HTTPException
-from app.models.models import Transaction, Order, Dish
-from app.schemas.schemas import TransactionCreate, OrderCreate
+from app.models.models import Transaction, Order, Dish, SettlementJob, IdempotencyKey
+from app.schemas.schemas import TransactionCreate, TransactionOut, OrderCreate
 from typing import List, Optional
 
-async def create_transaction(db: AsyncSession, transaction: TransactionCreate):
+# Допустимое расхождение суммы заказа и транзакции (погрешность округления цен)
+ORDER_TOTAL_TOLERANCE = 0.01
+
+async def create_transaction(db: AsyncSession, transaction: TransactionCreate, status: str = "pending"):
     db_transaction = Transaction(
         user_id=transaction.user_id,
         amount=transaction.amount,
-        payment_method=transaction.payment_method
+        payment_method=transaction.payment_method,
+        status=status
     )
     db.add(db_transaction)
+    # INSERT ... RETURNING заполняет id; результат снимается до commit, чтобы не перечитывать строку
+    await db.flush()
+    created_transaction = TransactionOut.model_validate(db_transaction)
     await db.commit()
-    await db.refresh(db_transaction)
-    return db_transaction
+    return created_transaction
+
+async def enqueue_transaction(db: AsyncSession, transaction: TransactionCreate):
+    # Транзакция и задание на её проведение сохраняются в одной транзакции БД
+    db_transaction = Transaction(
+        user_id=transaction.user_id,
+        amount=transaction.amount,
+        payment_method=transaction.payment_method,
+        status="pending",
+        closed_at=None
+    )
+    db.add(db_transaction)
+    await db.flush()
+    db.add(SettlementJob(transaction_id=db_transaction.id))
+    created_transaction = TransactionOut.model_validate(db_transaction)
+    await db.commit()
+    return created_transaction
+
+async def claim_settlement_jobs(db: AsyncSession, batch_size: int, lease: datetime.timedelta) -> List[SettlementJob]:
+    """
+    Берёт в аренду готовые к проведению задания. Вызывающий фиксирует транзакцию сразу после этого,
+    поэтому блокировки строк держатся только на время выборки, а не на время вызова провайдера.
+    """
+    now = datetime.datetime.now()
+    # SKIP LOCKED позволяет нескольким воркерам (и репликам) разбирать очередь без конфликтов
+    result = await db.execute(
+        select(SettlementJob)
+        .where(
+            SettlementJob.run_after <= now,
+            or_(SettlementJob.locked_until.is_(None), SettlementJob.locked_until < now),
+        )
+        .order_by(SettlementJob.id)
+        .limit(batch_size)
+        .with_for_update(skip_locked=True)
+    )
+    jobs = result.scalars().all()
+    for job in jobs:
+        job.locked_until = now + lease
+    return jobs
+
+async def get_transactions_by_ids(db: AsyncSession, transaction_ids: List[int]) -> List[Transaction]:
+    result = await db.execute(select(Transaction).where(Transaction.id.in_(transaction_ids)))
+    return result.scalars().all()
+
+async def settle_transactions(db: AsyncSession, job_ids: List[int], statuses: dict):
+    by_status = {}
+    for transaction_id, status in statuses.items():
+        by_status.setdefault(status, []).append(transaction_id)
+    for status, transaction_ids in by_status.items():
+        await db.execute(
+            update(Transaction)
+            .where(Transaction.id.in_(transaction_ids))
+            .values(status=status, closed_at=datetime.datetime.now())
+        )
+    await db.execute(delete(SettlementJob).where(SettlementJob.id.in_(job_ids)))
+
+async def reschedule_settlement_jobs(db: AsyncSession, retries: dict):
+    # retries: id задания -> (число попыток, время следующей попытки); аренда снимается
+    for job_id, (attempts, run_after) in retries.items():
+        await db.execute(
+            update(SettlementJob)
+            .where(SettlementJob.id == job_id)
+            .values(attempts=attempts, run_after=run_after, locked_until=None)
+        )
 
 async def get_transaction(db: AsyncSession, current_user: dict, transaction_id: int) -> Optional[Transaction]:
     result = await db.execute(select(Transaction).where(and_(Transaction.id == transaction_id, Transaction.user_id == current_user.get("id"))))
@@ -26,17 +95,19 @@ async def get_transaction_inner(db: AsyncSession, transaction_id: int) -> Option
     result = await db.execute(select(Transaction).where(Transaction.id == transaction_id))
     return result.scalars().first()
 
-async def get_transactions(db: AsyncSession, current_user: dict, skip: int = 0, limit: int = 10) -> List[Transaction]:
-    result = await db.execute(select(Transaction).where(Transaction.user_id == current_user.get("id")).offset(skip).limit(limit))
+async def get_transactions(db: AsyncSession, current_user: dict, skip: int = 0, limit: int = 10, after_id: int = None) -> List[Transaction]:
+    query = select(Transaction).where(Transaction.user_id == current_user.get("id")).order_by(Transaction.id).limit(limit)
+    # Keyset-пагинация по id, если передан курсор, иначе OFFSET
+    if after_id is not None:
+        query = query.where(Transaction.id > after_id)
+    else:
+        query = query.offset(skip)
+    result = await db.execute(query)
     return result.scalars().all()
 
-async def update_transaction_status(db: AsyncSession, transaction_id: int, status: str) -> Optional[Transaction]:
-    transaction = await get_transaction_inner(db, transaction_id)
-    if transaction:
-        transaction.status = status
-        await db.commit()
-        await db.refresh(transaction)
-    return transaction
+async def get_dish_prices(db: AsyncSession, dish_ids: set) -> dict:
+    result = await db.execute(select(Dish.id, Dish.price).where(Dish.id.in_(dish_ids)))
+    return {dish_id: price for dish_id, price in result.all()}
 
 async def create_order(db: AsyncSession, order: OrderCreate, current_user: dict):
     try:
@@ -44,10 +115,15 @@ async def create_order(db: AsyncSession, order: OrderCreate, current_user: dict)
         if not transaction or transaction.user_id != current_user.get("id"):
             raise HTTPException(status_code=400, detail=f"Transaction with id '{order.transaction_id}' doesn't exist or doesn't belong to the current user.")
 
-        for item in order.items:
-            dish_exists = await db.execute(select(Dish).where(Dish.id == item.dish_id))
-            if not dish_exists.scalars().first():
-                raise HTTPException(status_code=400, detail=f"Dish with id '{item.dish_id}' doesn't exist.")
+        prices = await get_dish_prices(db, {item.dish_id for item in order.items})
+        missing_ids = sorted({item.dish_id for item in order.items} - prices.keys())
+        if missing_ids:
+            raise HTTPException(status_code=400, detail=f"Dishes with ids {missing_ids} don't exist.")
+
+        # Сумма заказа считается по ценам из базы и должна совпадать с суммой транзакции
+        total = sum((prices[item.dish_id] or 0) * item.amount for item in order.items)
+        if abs(total - transaction.amount) > ORDER_TOTAL_TOLERANCE:
+            raise HTTPException(status_code=400, detail=f"Order total {total:.2f} doesn't match transaction amount {transaction.amount:.2f}.")
 
         db_order = Order(
             user_id=order.user_id,
@@ -66,8 +142,14 @@ async def get_order(db: AsyncSession, order_id: int) -> Optional[Order]:
     result = await db.execute(select(Order).where(Order.id == order_id))
     return result.scalars().first()
 
-async def get_orders(db: AsyncSession, current_user: dict, skip: int = 0, limit: int = 10) -> List[Order]:
-    result = await db.execute(select(Order).where(Order.user_id == current_user.get("id")).offset(skip).limit(limit))
+async def get_orders(db: AsyncSession, current_user: dict, skip: int = 0, limit: int = 10, after_id: int = None) -> List[Order]:
+    query = select(Order).where(Order.user_id == current_user.get("id")).order_by(Order.id).limit(limit)
+    # Keyset-пагинация по id, если передан курсор, иначе OFFSET
+    if after_id is not None:
+        query = query.where(Order.id > after_id)
+    else:
+        query = query.offset(skip)
+    result = await db.execute(query)
     return result.scalars().all()
 
 async def update_order_status(db: AsyncSession, order_id: int, status: str) -> Optional[Order]:
@@ -78,4 +160,42 @@ async def update_order_status(db: AsyncSession, order_id: int, status: str) -> O
             order.closed_at = datetime.now()
         await db.commit()
         await db.refresh(order)
-    return order
\ No newline at end of file
+    return order
+
+async def get_idempotency_key(db: AsyncSession, key: str) -> Optional[IdempotencyKey]:
+    result = await db.execute(select(IdempotencyKey).where(IdempotencyKey.key == key))
+    return result.scalars().first()
+
+async def reserve_idempotency_key(db: AsyncSession, key: str, request_hash: str, locked_until: datetime.datetime):
+    db.add(IdempotencyKey(key=key, request_hash=request_hash, locked_until=locked_until))
+    await db.commit()
+
+async def reclaim_idempotency_key(db: AsyncSession, key: str, locked_until: datetime.datetime) -> bool:
+    # Занимает незавершённый ключ с истёкшим сроком; из нескольких одновременных повторов это удаётся одному
+    result = await db.execute(
+        update(IdempotencyKey)
+        .where(
+            IdempotencyKey.key == key,
+            IdempotencyKey.status_code.is_(None),
+            IdempotencyKey.locked_until < datetime.datetime.now(),
+        )
+        .values(locked_until=locked_until)
+    )
+    await db.commit()
+    return result.rowcount == 1
+
+async def complete_idempotency_key(db: AsyncSession, key: str, status_code: int, response: dict, headers: dict):
+    await db.execute(
+        update(IdempotencyKey)
+        .where(IdempotencyKey.key == key)
+        .values(status_code=status_code, response=response, headers=headers)
+    )
+    await db.commit()
+
+async def delete_idempotency_key(db: AsyncSession, key: str):
+    await db.execute(delete(IdempotencyKey).where(IdempotencyKey.key == key))
+    await db.commit()
+
+async def delete_expired_idempotency_keys(db: AsyncSession, older_than: datetime.datetime):
+    await db.execute(delete(IdempotencyKey).where(IdempotencyKey.created_at < older_than))
+    await db.commit()
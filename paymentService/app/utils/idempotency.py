@@ -0,0 +1,89 @@
+import os
+import json
+import asyncio
+import hashlib
+import logging
+from datetime import datetime, timedelta
+from typing import Optional
+from fastapi import HTTPException, Response
+from fastapi.responses import JSONResponse
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.dependencies import AsyncSessionLocal
+from app.utils import crud
+
+# Сколько хранится сохранённый ответ и как часто удаляются устаревшие ключи
+IDEMPOTENCY_TTL = timedelta(seconds=float(os.getenv("IDEMPOTENCY_TTL", "86400")))
+IDEMPOTENCY_CLEANUP_INTERVAL = float(os.getenv("IDEMPOTENCY_CLEANUP_INTERVAL", "3600"))
+# Сколько ключ считается занятым исходным запросом; должно превышать время обработки запроса
+IDEMPOTENCY_LEASE = timedelta(seconds=float(os.getenv("IDEMPOTENCY_LEASE_SECONDS", "60")))
+# Заголовки ответа, сохраняемые вместе с телом и отдаваемые при повторе
+REPLAYED_HEADERS = ("location",)
+
+logger = logging.getLogger(__name__)
+
+
+def make_key(user_id: int, scope: str, idempotency_key: str) -> str:
+    return hashlib.sha256(f"{user_id}:{scope}:{idempotency_key}".encode()).hexdigest()
+
+
+def fingerprint(payload) -> str:
+    # Канонический JSON тела запроса: порядок полей и пробелы не влияют на хеш
+    body = json.dumps(payload.model_dump(mode="json"), sort_keys=True, separators=(",", ":"))
+    return hashlib.sha256(body.encode()).hexdigest()
+
+
+async def run_idempotent(db: AsyncSession, idempotency_key: Optional[str], user_id: int, scope: str,
+                         payload, status_code: int, schema, handler, response: Optional[Response] = None):
+    """
+    Выполняет handler не более одного раза для заданного Idempotency-Key.
+    Повторный запрос получает сохранённый ответ (и заголовки из REPLAYED_HEADERS, выставленные handler в response)
+    одним поиском по первичному ключу; повтор ключа с другим телом запроса отклоняется с 422.
+    Незавершённый ключ с истёкшим IDEMPOTENCY_LEASE снова занимается повтором.
+    """
+    if not idempotency_key:
+        return await handler()
+
+    key = make_key(user_id, scope, idempotency_key)
+    request_hash = fingerprint(payload)
+    stored = await crud.get_idempotency_key(db, key)
+    if stored is not None and stored.created_at < datetime.now() - IDEMPOTENCY_TTL:
+        await crud.delete_idempotency_key(db, key)
+        stored = None
+    if stored is not None:
+        if stored.request_hash != request_hash:
+            raise HTTPException(status_code=422, detail="Idempotency-Key was already used with a different request body")
+        if stored.status_code is not None:
+            headers = {**(stored.headers or {}), "Idempotent-Replayed": "true"}
+            return JSONResponse(stored.response, status_code=stored.status_code, headers=headers)
+        if not await crud.reclaim_idempotency_key(db, key, datetime.now() + IDEMPOTENCY_LEASE):
+            raise HTTPException(status_code=409, detail="A request with this Idempotency-Key is still being processed")
+    else:
+        try:
+            await crud.reserve_idempotency_key(db, key, request_hash, datetime.now() + IDEMPOTENCY_LEASE)
+        except IntegrityError:
+            await db.rollback()
+            raise HTTPException(status_code=409, detail="A request with this Idempotency-Key is still being processed")
+
+    try:
+        result = await handler()
+    except BaseException:
+        await db.rollback()
+        await crud.delete_idempotency_key(db, key)
+        raise
+
+    headers = {}
+    if response is not None:
+        headers = {name: response.headers[name] for name in REPLAYED_HEADERS if name in response.headers}
+    await crud.complete_idempotency_key(db, key, status_code, schema.model_validate(result).model_dump(mode="json"), headers)
+    return result
+
+
+async def cleanup_expired_keys():
+    while True:
+        await asyncio.sleep(IDEMPOTENCY_CLEANUP_INTERVAL)
+        try:
+            async with AsyncSessionLocal() as db:
+                await crud.delete_expired_idempotency_keys(db, datetime.now() - IDEMPOTENCY_TTL)
+        except Exception:
+            logger.exception("Idempotency cleanup error")
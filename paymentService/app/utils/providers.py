@@ -0,0 +1,43 @@
+import os
+import asyncio
+from typing import Protocol
+from app.schemas.schemas import TransactionCreate
+
+# fake — мгновенное подтверждение, simulated — подтверждение с искусственной задержкой
+PAYMENT_PROVIDER = os.getenv("PAYMENT_PROVIDER", "fake")
+PAYMENT_PROVIDER_LATENCY = float(os.getenv("PAYMENT_PROVIDER_LATENCY", "1.0"))
+
+
+class PaymentProvider(Protocol):
+    """
+    Платёжный провайдер: списывает сумму транзакции и возвращает её итоговый статус.
+    """
+
+    async def charge(self, transaction: TransactionCreate) -> str: ...
+
+
+class FakePaymentProvider:
+    async def charge(self, transaction: TransactionCreate) -> str:
+        return "completed"
+
+
+class SimulatedPaymentProvider:
+    def __init__(self, latency: float):
+        self.latency = latency
+
+    async def charge(self, transaction: TransactionCreate) -> str:
+        await asyncio.sleep(self.latency)
+        return "completed"
+
+
+def create_provider() -> PaymentProvider:
+    if PAYMENT_PROVIDER == "simulated":
+        return SimulatedPaymentProvider(PAYMENT_PROVIDER_LATENCY)
+    return FakePaymentProvider()
+
+
+payment_provider = create_provider()
+
+
+def get_payment_provider() -> PaymentProvider:
+    return payment_provider
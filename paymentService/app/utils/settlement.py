@@ -0,0 +1,112 @@
+import os
+import asyncio
+import logging
+from datetime import datetime, timedelta
+from app.dependencies import AsyncSessionLocal
+from app.schemas.schemas import TransactionOut
+from app.utils import crud
+from app.utils.providers import payment_provider
+
+# async — POST /payments/pay/ только ставит транзакцию в очередь, sync — проводит её в рамках запроса
+PAYMENT_SETTLEMENT = os.getenv("PAYMENT_SETTLEMENT", "async")
+PAYMENT_WORKERS = int(os.getenv("PAYMENT_WORKERS", "4"))
+PAYMENT_BATCH_SIZE = int(os.getenv("PAYMENT_BATCH_SIZE", "50"))
+PAYMENT_POLL_INTERVAL = float(os.getenv("PAYMENT_POLL_INTERVAL", "1.0"))
+PAYMENT_MAX_ATTEMPTS = int(os.getenv("PAYMENT_MAX_ATTEMPTS", "5"))
+# Задержка перед повтором: PAYMENT_RETRY_BASE * 2^(попытка - 1), но не больше PAYMENT_RETRY_MAX секунд
+PAYMENT_RETRY_BASE = float(os.getenv("PAYMENT_RETRY_BASE", "2"))
+PAYMENT_RETRY_MAX = float(os.getenv("PAYMENT_RETRY_MAX", "300"))
+# Аренда задания должна с запасом превышать время ответа провайдера, иначе задание возьмёт другой воркер
+PAYMENT_LEASE = timedelta(seconds=float(os.getenv("PAYMENT_LEASE_SECONDS", "60")))
+
+logger = logging.getLogger(__name__)
+
+
+class SettlementWorkers:
+    """
+    Пул asyncio-воркеров, которые пачками проводят транзакции из таблицы settlement_jobs.
+    Очередь хранится в Postgres, поэтому задания переживают перезапуск сервиса.
+    """
+
+    def __init__(self, concurrency: int, batch_size: int, poll_interval: float):
+        self.concurrency = concurrency
+        self.batch_size = batch_size
+        self.poll_interval = poll_interval
+        self._wakeup = asyncio.Event()
+        self._tasks: list[asyncio.Task] = []
+
+    def start(self):
+        self._tasks = [asyncio.create_task(self._run()) for _ in range(self.concurrency)]
+
+    async def stop(self):
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    def notify(self):
+        # Новые задания из этого процесса подхватываются сразу, не дожидаясь следующего опроса
+        self._wakeup.set()
+
+    async def _run(self):
+        while True:
+            try:
+                settled = await self.settle_batch()
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                logger.exception("Settlement worker error")
+                settled = 0
+            if settled < self.batch_size:
+                self._wakeup.clear()
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), timeout=self.poll_interval)
+                except asyncio.TimeoutError:
+                    pass
+
+    async def settle_batch(self) -> int:
+        async with AsyncSessionLocal() as db:
+            jobs = await crud.claim_settlement_jobs(db, self.batch_size, PAYMENT_LEASE)
+            if not jobs:
+                await db.rollback()
+                return 0
+            transactions = {
+                transaction.id: TransactionOut.model_validate(transaction)
+                for transaction in await crud.get_transactions_by_ids(db, [job.transaction_id for job in jobs])
+            }
+            claimed = [(job.id, job.transaction_id, job.attempts) for job in jobs]
+            await db.commit()
+
+        # Провайдер вызывается вне транзакции: блокировки сняты, соединение возвращено в пул
+        results = await asyncio.gather(
+            *(payment_provider.charge(transactions[transaction_id]) for _, transaction_id, _ in claimed),
+            return_exceptions=True,
+        )
+
+        now = datetime.now()
+        settled, statuses, retries = [], {}, {}
+        for (job_id, transaction_id, attempts), result in zip(claimed, results):
+            if isinstance(result, Exception):
+                attempts += 1
+                if attempts < PAYMENT_MAX_ATTEMPTS:
+                    retries[job_id] = (attempts, now + retry_delay(attempts))
+                    continue
+                logger.warning("Transaction %s failed after %s attempts: %s", transaction_id, attempts, result)
+                result = "failed"
+            settled.append(job_id)
+            statuses[transaction_id] = result
+
+        async with AsyncSessionLocal() as db:
+            if settled:
+                await crud.settle_transactions(db, settled, statuses)
+            if retries:
+                await crud.reschedule_settlement_jobs(db, retries)
+            await db.commit()
+        return len(claimed)
+
+
+def retry_delay(attempts: int) -> timedelta:
+    return timedelta(seconds=min(PAYMENT_RETRY_MAX, PAYMENT_RETRY_BASE * 2 ** (attempts - 1)))
+
+
+settlement_workers = SettlementWorkers(PAYMENT_WORKERS, PAYMENT_BATCH_SIZE, PAYMENT_POLL_INTERVAL)
@@ -16,9 +16,12 @@ config = context.config
 if config.config_file_name is not None:
     fileConfig(config.config_file_name)
 
+# Сервисы используют одну базу, поэтому у каждого своя таблица версий Alembic
+VERSION_TABLE = "alembic_version_user"
+
 # add your model's MetaData object here
 # for 'autogenerate' support
-from userService.app.models import models
+from app.models import models
 target_metadata = models.Base.metadata
 
 def get_url():
@@ -32,6 +35,7 @@ def run_migrations_offline() -> None:
         target_metadata=target_metadata,
         literal_binds=True,
         dialect_opts={"paramstyle": "named"},
+        version_table=VERSION_TABLE,
     )
 
     with context.begin_transaction():
@@ -40,7 +44,8 @@ def run_migrations_offline() -> None:
 def do_run_migrations(connection):
     context.configure(
         connection=connection,
-        target_metadata=target_metadata
+        target_metadata=target_metadata,
+        version_table=VERSION_TABLE,
     )
 
     with context.begin_transaction():
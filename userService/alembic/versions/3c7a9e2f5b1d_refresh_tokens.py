@@ -0,0 +1,42 @@
+"""refresh tokens
+
+Revision ID: 3c7a9e2f5b1d
+Revises: 
+Create Date: 2026-10-18 15:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '3c7a9e2f5b1d'
+down_revision: Union[str, None] = None
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # Таблица могла быть создана через create_all при старте сервиса; на пустой базе
+    # миграции выполняются до create_all, и все таблицы создаст он
+    inspector = sa.inspect(op.get_bind())
+    if inspector.has_table('refresh_tokens') or not inspector.has_table('users'):
+        return
+    op.create_table(
+        'refresh_tokens',
+        sa.Column('token_hash', sa.LargeBinary(length=32), primary_key=True),
+        sa.Column('family_id', sa.LargeBinary(length=16), nullable=False),
+        sa.Column('user_id', sa.Integer(), sa.ForeignKey('users.id', ondelete='CASCADE'), nullable=False),
+        sa.Column('expires_at', sa.DateTime(), nullable=False),
+        sa.Column('revoked', sa.Boolean(), nullable=False),
+    )
+    op.create_index('ix_refresh_tokens_family_id', 'refresh_tokens', ['family_id'])
+    op.create_index('ix_refresh_tokens_user_id', 'refresh_tokens', ['user_id'])
+
+
+def downgrade() -> None:
+    op.drop_index('ix_refresh_tokens_user_id', table_name='refresh_tokens')
+    op.drop_index('ix_refresh_tokens_family_id', table_name='refresh_tokens')
+    op.drop_table('refresh_tokens')
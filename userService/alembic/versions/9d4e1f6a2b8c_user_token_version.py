@@ -0,0 +1,29 @@
+"""user token version
+
+Revision ID: 9d4e1f6a2b8c
+Revises: 3c7a9e2f5b1d
+Create Date: 2026-10-18 16:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '9d4e1f6a2b8c'
+down_revision: Union[str, None] = '3c7a9e2f5b1d'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # На пустой базе таблицу users вместе с колонкой создаст create_all при старте сервисов
+    if not sa.inspect(op.get_bind()).has_table('users'):
+        return
+    op.execute('ALTER TABLE users ADD COLUMN IF NOT EXISTS token_version INTEGER NOT NULL DEFAULT 0')
+
+
+def downgrade() -> None:
+    op.drop_column('users', 'token_version')
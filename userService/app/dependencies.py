@@ -3,10 +3,12 @@ from datetime import datetime, timedelta
 from jose import JWTError, jwt
 from fastapi import Depends, HTTPException
 from fastapi.security import OAuth2PasswordBearer
-from sqlalchemy.ext.asyncio import create_async_engine, AsyncSession
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import sessionmaker
 from dotenv import load_dotenv
-from app.utils import crud
+from app.schemas import schemas
+from app.utils import crud, database
+from app.utils.token_versions import token_versions
 
 load_dotenv()
 # 1
@@ -14,9 +16,11 @@ DATABASE_URL = os.getenv("DATABASE_URL")
 SECRET_KEY = os.getenv("SECRET_KEY", "your-secret-key")
 ADMIN_SECRET_KEY = os.getenv("ADMIN_SECRET_KEY")
 ALGORITHM = "HS256"
-ACCESS_TOKEN_EXPIRE_MINUTES = 30
+# Короткоживущие access-токены обновляются по refresh-токену без проверки пароля
+ACCESS_TOKEN_EXPIRE_MINUTES = int(os.getenv("ACCESS_TOKEN_EXPIRE_MINUTES", "15"))
+REFRESH_TOKEN_EXPIRE_DAYS = int(os.getenv("REFRESH_TOKEN_EXPIRE_DAYS", "14"))
 
-engine = create_async_engine(DATABASE_URL, echo=True)
+engine = database.create_engine(DATABASE_URL)
 
 AsyncSessionLocal = sessionmaker(
     engine, class_=AsyncSession, autocommit=False, autoflush=False
@@ -37,6 +41,23 @@ def create_access_token(data: dict, expires_delta: timedelta = None):
     to_encode.update({"exp": expire})
     return jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
 
+def token_claims(user) -> dict:
+    return {
+        "sub": user.username,
+        "id": user.id,
+        "role": user.role,
+        "email": user.email,
+        "ver": user.token_version,
+    }
+
+async def current_token_version(db: AsyncSession, user_id: int):
+    version = token_versions.get(user_id)
+    if version is None:
+        version = await crud.get_token_version(db, user_id)
+        if version is not None:
+            token_versions.put(user_id, version)
+    return version
+
 async def get_current_user(token: str = Depends(oauth2_scheme), db: AsyncSession = Depends(get_db)):
     credentials_exception = HTTPException(
         status_code=401,
@@ -49,6 +70,19 @@ async def get_current_user(token: str = Depends(oauth2_scheme), db: AsyncSession
             raise credentials_exception
     except JWTError:
         raise credentials_exception
+    # Токены с полным набором claims проверяются без чтения пользователя из БД: нужна только его текущая версия,
+    # которая берётся из кэша. Сессия не открывает соединение, пока к ней нет запросов.
+    if all(payload.get(claim) is not None for claim in ("id", "role", "email", "ver")):
+        version = await current_token_version(db, payload["id"])
+        if version is None or payload["ver"] < version:
+            raise credentials_exception
+        return schemas.UserOut(
+            id=payload["id"],
+            username=username,
+            email=payload["email"],
+            role=payload["role"],
+        )
+    # Токены, выпущенные до появления claims
     user = await crud.get_user_by_username(db, username)
     if not user:
         raise credentials_exception
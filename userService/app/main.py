@@ -3,14 +3,38 @@ from fastapi.staticfiles import StaticFiles
 from contextlib import asynccontextmanager
 from fastapi.openapi.utils import get_openapi
 from app.routers import user
+from app.models import models
+from app.dependencies import engine
+from app.utils import database
+from app.utils.passwords import password_hasher
+from app.utils.token_versions import token_versions
 from fastapi.middleware.cors import CORSMiddleware
 from starlette.responses import JSONResponse
 
-app = FastAPI(title="User Service")
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    async with engine.begin() as conn:
+        await conn.run_sync(models.Base.metadata.create_all)
+    yield
+    password_hasher.shutdown()
+
+app = FastAPI(title="User Service", lifespan=lifespan)
 
 # Подключаем роутеры
 app.include_router(user.router, prefix="/users", tags=["Users"])
 
+@app.get("/metrics/db-pool", include_in_schema=False)
+async def db_pool_metrics():
+    return database.pool_stats(engine)
+
+@app.get("/metrics/password-pool", include_in_schema=False)
+async def password_pool_metrics():
+    return password_hasher.stats()
+
+@app.get("/metrics/token-versions", include_in_schema=False)
+async def token_version_metrics():
+    return token_versions.stats()
+
 # Определяем схему безопасности
 def custom_openapi():
     if app.openapi_schema:
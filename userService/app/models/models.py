@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String
+from sqlalchemy import Column, Integer, String, LargeBinary, DateTime, Boolean, ForeignKey
 from sqlalchemy.orm import declarative_base
 
 Base = declarative_base()
@@ -11,4 +11,18 @@ class User(Base):
     email = Column(String, unique=True, index=True)
     password_hash = Column(String)
     address = Column(String)
-    role = Column(String, default='user')
\ No newline at end of file
+    role = Column(String, default='user')
+    # Увеличивается при отзыве всех токенов пользователя; user_service сразу перестаёт принимать
+    # выданные ранее access-токены, остальные сервисы - после их истечения
+    token_version = Column(Integer, nullable=False, default=0, server_default='0')
+
+class RefreshToken(Base):
+    __tablename__ = 'refresh_tokens'
+
+    # Хранится только SHA-256 токена: утечка таблицы не даёт действующих токенов
+    token_hash = Column(LargeBinary(32), primary_key=True)
+    # Все токены, полученные ротацией от одного входа; при повторном использовании отзываются вместе
+    family_id = Column(LargeBinary(16), nullable=False, index=True)
+    user_id = Column(Integer, ForeignKey('users.id', ondelete='CASCADE'), nullable=False, index=True)
+    expires_at = Column(DateTime, nullable=False)
+    revoked = Column(Boolean, nullable=False, default=False)
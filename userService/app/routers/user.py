@@ -4,10 +4,21 @@ from sqlalchemy.ext.asyncio import AsyncSession
 from app import dependencies
 from app.utils import crud
 from app.schemas import schemas
+from app.utils.token_versions import token_versions
 from datetime import timedelta
 
 router = APIRouter()
 
+def issue_token(claims: dict, refresh_token: str) -> schemas.Token:
+    access_token_expires = timedelta(minutes=dependencies.ACCESS_TOKEN_EXPIRE_MINUTES)
+    access_token = dependencies.create_access_token(data=claims, expires_delta=access_token_expires)
+    return schemas.Token(
+        access_token=access_token,
+        token_type="bearer",
+        refresh_token=refresh_token,
+        expires_in=int(access_token_expires.total_seconds()),
+    )
+
 @router.post("/token", response_model=schemas.Token)
 async def login_for_access_token(
     form_data: OAuth2PasswordRequestForm = Depends(),
@@ -16,11 +27,33 @@ async def login_for_access_token(
     user = await crud.authenticate_user(db, form_data.username, form_data.password)
     if not user:
         raise HTTPException(status_code=401, detail="Incorrect username or password")
-    access_token_expires = timedelta(minutes=dependencies.ACCESS_TOKEN_EXPIRE_MINUTES)
-    access_token = dependencies.create_access_token(
-        data={"sub": user.username}, expires_delta=access_token_expires
+    # Claims собираются до commit: после него атрибуты пользователя сбрасываются
+    claims = dependencies.token_claims(user)
+    refresh_token = await crud.create_refresh_token(
+        db, user.id, timedelta(days=dependencies.REFRESH_TOKEN_EXPIRE_DAYS)
     )
-    return schemas.Token(access_token=access_token, token_type="bearer")
+    return issue_token(claims, refresh_token)
+
+# Новая пара токенов без проверки пароля; предъявленный refresh-токен больше не действует
+@router.post("/token/refresh", response_model=schemas.Token)
+async def refresh_access_token(
+    request: schemas.RefreshTokenRequest,
+    db: AsyncSession = Depends(dependencies.get_db)
+):
+    rotated = await crud.rotate_refresh_token(
+        db, request.refresh_token, timedelta(days=dependencies.REFRESH_TOKEN_EXPIRE_DAYS)
+    )
+    if rotated is None:
+        raise HTTPException(status_code=401, detail="Invalid refresh token")
+    user, refresh_token = rotated
+    return issue_token(dependencies.token_claims(user), refresh_token)
+
+@router.post("/token/revoke", status_code=204)
+async def revoke_refresh_token(
+    request: schemas.RefreshTokenRequest,
+    db: AsyncSession = Depends(dependencies.get_db)
+):
+    await crud.revoke_refresh_token(db, request.refresh_token)
 
 @router.post("/registration/", response_model=schemas.UserOut)
 async def create_user(user: schemas.UserCreate, db: AsyncSession = Depends(dependencies.get_db)):
@@ -44,6 +77,28 @@ async def create_admin_user(
         raise HTTPException(status_code=400, detail="Пользователь уже зарегистрирован")
     return await crud.create_user(db=db, user=admin_user)
 
+# Выход на всех устройствах: refresh-токены отзываются сразу, поэтому новые access-токены получить нельзя.
+# Уже выданные access-токены отклоняет только user_service; сервисы с AUTH_MODE=local принимают их до истечения
+@router.post("/token/revoke-all", status_code=204)
+async def revoke_all_tokens(
+    current_user: schemas.UserOut = Depends(dependencies.get_current_user),
+    db: AsyncSession = Depends(dependencies.get_db)
+):
+    version = await crud.bump_token_version(db, current_user.id)
+    token_versions.put(current_user.id, version)
+
+# Полный профиль пользователя из БД (включая address)
 @router.get("/me/", response_model=schemas.UserOut)
-async def read_users_me(current_user: schemas.UserOut = Depends(dependencies.get_current_user)):
+async def read_users_me(
+    current_user: schemas.UserOut = Depends(dependencies.get_current_user),
+    db: AsyncSession = Depends(dependencies.get_db)
+):
+    user = await crud.get_user(db, current_user.id)
+    if not user:
+        raise HTTPException(status_code=404, detail="Пользователь не найден")
+    return user
+
+# Проверка токена для других сервисов: отвечает по claims без чтения пользователя из БД, address не возвращается
+@router.get("/me/claims", response_model=schemas.UserOut)
+async def read_users_claims(current_user: schemas.UserOut = Depends(dependencies.get_current_user)):
     return current_user
\ No newline at end of file
@@ -1,19 +1,19 @@
+import hashlib
+import secrets
+from datetime import datetime, timedelta
+from typing import Optional
+from sqlalchemy import update, delete
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.future import select
-from passlib.context import CryptContext
 from app.models import models
 from app.schemas import schemas
+from app.utils.passwords import password_hasher
 
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
-
-def hash_password(password: str):
-    return pwd_context.hash(password)
-
-def verify_password(plain_password: str, hashed_password: str):
-    return pwd_context.verify(plain_password, hashed_password)
+async def hash_password(password: str):
+    return await password_hasher.hash(password)
 
 async def create_user(db: AsyncSession, user: schemas.UserCreate):
-    hashed_password = hash_password(user.password)
+    hashed_password = await hash_password(user.password)
     db_user = models.User(
         username=user.username,
         email=user.email,
@@ -30,6 +30,31 @@ async def get_user(db: AsyncSession, user_id: int):
     result = await db.execute(select(models.User).filter(models.User.id == user_id))
     return result.scalars().first()
 
+async def get_token_version(db: AsyncSession, user_id: int) -> Optional[int]:
+    result = await db.execute(select(models.User.token_version).filter(models.User.id == user_id))
+    return result.scalars().first()
+
+async def bump_token_version(db: AsyncSession, user_id: int) -> int:
+    """
+    Увеличивает версию токенов пользователя и отзывает его refresh-токены. Старые access-токены
+    user_service отклоняет сразу, а сервисы с AUTH_MODE=local проверяют только подпись и exp,
+    поэтому там они действуют до истечения (ACCESS_TOKEN_EXPIRE_MINUTES).
+    """
+    result = await db.execute(
+        update(models.User)
+        .where(models.User.id == user_id)
+        .values(token_version=models.User.token_version + 1)
+        .returning(models.User.token_version)
+    )
+    version = result.scalar_one()
+    await db.execute(
+        update(models.RefreshToken)
+        .where(models.RefreshToken.user_id == user_id)
+        .values(revoked=True)
+    )
+    await db.commit()
+    return version
+
 async def get_user_by_username(db: AsyncSession, username: str):
     result = await db.execute(select(models.User).filter(models.User.username == username))
     return result.scalars().first()
@@ -38,6 +63,84 @@ async def authenticate_user(db: AsyncSession, username: str, password: str):
     user = await get_user_by_username(db, username)
     if not user:
         return False
-    if not verify_password(password, user.password_hash):
+    verified, new_hash = await password_hasher.verify_and_update(password, user.password_hash)
+    if not verified:
+        return False
+    # Хеш со старыми параметрами bcrypt заменяется при первом успешном входе
+    if new_hash:
+        user.password_hash = new_hash
+        await db.commit()
+        await db.refresh(user)
+    return user
+
+def hash_refresh_token(token: str) -> bytes:
+    return hashlib.sha256(token.encode()).digest()
+
+def _new_refresh_token(user_id: int, family_id: bytes, expires_delta: timedelta) -> tuple[str, models.RefreshToken]:
+    token = secrets.token_urlsafe(32)
+    return token, models.RefreshToken(
+        token_hash=hash_refresh_token(token),
+        family_id=family_id,
+        user_id=user_id,
+        expires_at=datetime.now() + expires_delta,
+    )
+
+async def create_refresh_token(db: AsyncSession, user_id: int, expires_delta: timedelta) -> str:
+    # Заодно удаляем истёкшие токены пользователя, чтобы таблица не росла
+    await db.execute(
+        delete(models.RefreshToken).where(
+            models.RefreshToken.user_id == user_id,
+            models.RefreshToken.expires_at < datetime.now(),
+        )
+    )
+    token, db_token = _new_refresh_token(user_id, secrets.token_bytes(16), expires_delta)
+    db.add(db_token)
+    await db.commit()
+    return token
+
+async def rotate_refresh_token(db: AsyncSession, token: str, expires_delta: timedelta) -> Optional[tuple[models.User, str]]:
+    """
+    Обменивает refresh-токен на новый из того же семейства. Повторное предъявление уже
+    использованного токена означает утечку, поэтому всё семейство отзывается.
+    """
+    result = await db.execute(
+        select(models.RefreshToken)
+        .filter(models.RefreshToken.token_hash == hash_refresh_token(token))
+        .with_for_update()
+    )
+    stored = result.scalars().first()
+    if stored is None or stored.expires_at <= datetime.now():
+        await db.rollback()
+        return None
+    if stored.revoked:
+        await revoke_token_family(db, stored.family_id)
+        return None
+    user = await get_user(db, stored.user_id)
+    if user is None:
+        await db.rollback()
+        return None
+    stored.revoked = True
+    new_token, db_token = _new_refresh_token(user.id, stored.family_id, expires_delta)
+    db.add(db_token)
+    await db.commit()
+    await db.refresh(user)
+    return user, new_token
+
+async def revoke_token_family(db: AsyncSession, family_id: bytes):
+    await db.execute(
+        update(models.RefreshToken)
+        .where(models.RefreshToken.family_id == family_id)
+        .values(revoked=True)
+    )
+    await db.commit()
+
+async def revoke_refresh_token(db: AsyncSession, token: str) -> bool:
+    result = await db.execute(
+        select(models.RefreshToken.family_id)
+        .filter(models.RefreshToken.token_hash == hash_refresh_token(token))
+    )
+    family_id = result.scalars().first()
+    if family_id is None:
         return False
-    return user
\ No newline at end of file
+    await revoke_token_family(db, family_id)
+    return True
\ No newline at end of file
@@ -0,0 +1,49 @@
+import os
+import time
+from collections import OrderedDict
+from typing import Optional
+
+# Версии токенов пользователей, прочитанные из БД; после отзыва другие реплики узнают о нём не позже чем через TTL
+TOKEN_VERSION_CACHE_SIZE = int(os.getenv("TOKEN_VERSION_CACHE_SIZE", "10000"))
+TOKEN_VERSION_CACHE_TTL = float(os.getenv("TOKEN_VERSION_CACHE_TTL", "30"))
+
+
+class TokenVersionCache:
+    """
+    LRU-кэш user_id -> token_version. Токен с версией меньше текущей считается отозванным.
+    """
+
+    def __init__(self, max_size: int, ttl: float):
+        self.max_size = max_size
+        self.ttl = ttl
+        self._entries: OrderedDict[int, tuple[float, int]] = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, user_id: int) -> Optional[int]:
+        entry = self._entries.get(user_id)
+        if entry is None or entry[0] <= time.monotonic():
+            self._entries.pop(user_id, None)
+            self.misses += 1
+            return None
+        self._entries.move_to_end(user_id)
+        self.hits += 1
+        return entry[1]
+
+    def put(self, user_id: int, version: int):
+        self._entries[user_id] = (time.monotonic() + self.ttl, version)
+        self._entries.move_to_end(user_id)
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+
+    def stats(self) -> dict:
+        return {
+            "size": len(self._entries),
+            "max_size": self.max_size,
+            "ttl": self.ttl,
+            "hits": self.hits,
+            "misses": self.misses,
+        }
+
+
+token_versions = TokenVersionCache(TOKEN_VERSION_CACHE_SIZE, TOKEN_VERSION_CACHE_TTL)